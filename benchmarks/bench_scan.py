@@ -0,0 +1,199 @@
+#! /usr/bin/env python3
+"""
+Benchmark of the scan pipeline over a synthetic monorepo and the local mock registry.
+It reports the throughput of manifest discovery, manifest parsing and dependency resolution.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_registry import add_registry_arguments, REGISTRY_HOSTS
+from generate_monorepo import generate_monorepo, MONOREPO_PROVIDERS
+from utils.discovery import discover_manifests
+from utils.recover_dependencies import RecoverDependencies
+from utils.scanner import Scanner
+
+
+def spawn_registry(args):
+    """
+    Method used to start the mock registry in its own process, so it doesn't compete with the scan
+    for the interpreter. Returns the process and the URL it listens on.
+    """
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_registry.py"),
+               "--port", "0"]
+    for option in ["packages", "fanout", "missing_ratio", "latency", "throttle_ratio", "retry_after", "seed"]:
+        command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    url = process.stdout.readline().split(" on ")[1].split(",")[0]
+    return process, url
+
+
+def registry_counters(url):
+    """
+    Method used to recover the number of requests answered by the mock registry
+    """
+    with urllib.request.urlopen(f"{url}/_stats") as response:
+        return json.load(response)
+
+
+def quiet():
+    """
+    Method used to silence the per package messages of the scan while it is timed
+    """
+    return contextlib.redirect_stdout(open(os.devnull, "w", encoding="utf-8"))
+
+
+def parse(path, manifests, providers, parse_workers):
+    """
+    Method used to parse the manifests of every provider, returns the dependencies by provider
+    """
+    parsed = {}
+    for provider in providers:
+        rd = RecoverDependencies(path, provider, manifests, parse_workers=parse_workers)
+        rd.run()
+        parsed[provider] = (rd.dependencies, rd.locked)
+    return parsed
+
+
+def resolve(scanner, parsed):
+    """
+    Method used to analyze every provider at the same time like --provider all, returns the analyzers
+    """
+    def analyze(provider):
+        dependencies, locked = parsed[provider]
+        analyzer = scanner.build_analyzer(provider, dict(dependencies), locked)
+        analyzer.analyze()
+        return analyzer
+
+    providers = [provider for provider in parsed if len(parsed[provider][0]) > 0]
+    with ThreadPoolExecutor(max_workers=max(1, len(providers))) as executor:
+        return dict(zip(providers, executor.map(analyze, providers)))
+
+
+def compare(results, baseline, tolerance):
+    """
+    Method used to list the throughputs which dropped below the baseline by more than the tolerance
+    """
+    regressions = []
+    for stage, rate in baseline.items():
+        if stage in results and results[stage] < rate * (1 - tolerance):
+            regressions.append(f"{stage}: {results[stage]:.0f}/s instead of {rate:.0f}/s")
+    return regressions
+
+
+def main():
+    """
+    Main method to launch the benchmark
+    """
+    parser = argparse.ArgumentParser(prog='bench_scan.py', description='Scan pipeline benchmark')
+    parser.add_argument('--path',
+                        help="Monorepo to scan, a synthetic one is generated if not set",
+                        default=None,
+                        type=str)
+    parser.add_argument('--manifests',
+                        help="Number of manifests of the synthetic monorepo",
+                        default=1000,
+                        type=int)
+    parser.add_argument('--dependencies',
+                        help="Number of dependencies declared by every manifest",
+                        default=5,
+                        type=int)
+    parser.add_argument('--providers',
+                        default=",".join(MONOREPO_PROVIDERS),
+                        type=str)
+    add_registry_arguments(parser)
+    parser.add_argument('--concurrency', default=16, type=int)
+    parser.add_argument('--graph-mode', default="recursive", type=str)
+    parser.add_argument('--parse-workers', default=1, type=int)
+    parser.add_argument('--rate-limit',
+                        help="Requests per second allowed per registry host, high by default to measure the scan itself",
+                        default=1000000.0,
+                        type=float)
+    parser.add_argument('--output',
+                        help="JSON file where the throughputs are saved",
+                        default=None,
+                        type=str)
+    parser.add_argument('--baseline',
+                        help="JSON file saved by a previous run, the benchmark fails if a throughput dropped",
+                        default=None,
+                        type=str)
+    parser.add_argument('--tolerance',
+                        help="Share of a baseline throughput which may be lost without failing",
+                        default=0.2,
+                        type=float)
+    args = parser.parse_args()
+    providers = args.providers.split(",")
+
+    path = args.path
+    if path is None:
+        path = tempfile.mkdtemp(prefix="depfu-monorepo-")
+        start = time.perf_counter()
+        generate_monorepo(path, args.manifests, args.dependencies, args.packages, providers, args.seed)
+        print(f"[+] Generated {args.manifests} manifests in {time.perf_counter() - start:.2f}s")
+
+    process, url = spawn_registry(args)
+    scanner = Scanner(concurrency=args.concurrency, graph_mode=args.graph_mode, rate=args.rate_limit,
+                      host_concurrency=max(args.concurrency, 32),
+                      base_urls={host: url for host in REGISTRY_HOSTS})
+    try:
+        start = time.perf_counter()
+        manifests = discover_manifests(path)
+        discovery = time.perf_counter() - start
+        found = sum(len(manifests[provider]) for provider in providers)
+
+        start = time.perf_counter()
+        with quiet():
+            parsed = parse(path, manifests, providers, args.parse_workers)
+        parsing = time.perf_counter() - start
+        declared = sum(len(dependencies) for dependencies, _ in parsed.values())
+
+        start = time.perf_counter()
+        with quiet():
+            analyzers = resolve(scanner, parsed)
+        resolution = time.perf_counter() - start
+        checked = sum(len(analyzer.already_done) for analyzer in analyzers.values())
+        takeover = sum(len(analyzer.takeover) for analyzer in analyzers.values())
+        counters = registry_counters(url)
+    finally:
+        scanner.close()
+        process.send_signal(signal.SIGINT)
+        process.wait()
+        if args.path is None:
+            shutil.rmtree(path)
+
+    requests_sent = counters["requests"]
+    results = {"discovery_manifests": found / discovery,
+               "parse_manifests": found / parsing,
+               "resolution_packages": checked / resolution,
+               "resolution_requests": requests_sent / resolution}
+    print(f"[+] Discovery   {discovery:8.2f}s  {found} manifests  {results['discovery_manifests']:10.0f} manifests/s")
+    print(f"[+] Parsing     {parsing:8.2f}s  {declared} dependencies  {results['parse_manifests']:10.0f} manifests/s")
+    print(f"[+] Resolution  {resolution:8.2f}s  {checked} packages  {results['resolution_packages']:10.0f} packages/s  "
+          f"{requests_sent} requests ({counters['throttled']} throttled)  {takeover} takeover")
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as fd:
+            json.dump(results, fd, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as fd:
+            regressions = compare(results, json.load(fd), args.tolerance)
+        for regression in regressions:
+            print(f"[-] Regression of {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
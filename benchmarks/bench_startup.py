@@ -0,0 +1,137 @@
+#! /usr/bin/env python3
+"""
+Benchmark of the startup of depfu, from the interpreter launch to a scan ready to send its first request.
+It fails when optional dependencies are imported by runs which don't use them, or when startup got slower.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only needed by the banner, email checks, manifest parsers and the service
+LAZY_MODULES = ("pyfiglet", "whois", "requirements", "defusedxml", "pip._vendor.tomli", "http.server")
+
+# What a `main.py --provider npm --dependency left-pad --no-banner` run imports before its first request
+DEPENDENCY_PROBE = """
+import sys, json
+sys.argv = ["main.py", "--provider", "npm", "--dependency", "left-pad", "--no-banner"]
+import main
+from utils.scanner import Scanner
+scanner = Scanner()
+scanner.build_analyzer("npm", {"left-pad": ""})
+scanner.close()
+print(json.dumps(sorted(name for name in %r if name in sys.modules)))
+""" % (LAZY_MODULES,)
+
+# What a `--check-email` run builds before its first request, checkers must be usable without a session
+EMAIL_PROBE = """
+import sys
+sys.argv = ["main.py", "--provider", "npm", "--dependency", "left-pad", "--check-email", "1", "--no-banner"]
+import main
+from utils.scanner import Scanner
+from utils.email_checker import EmailChecker
+scanner = Scanner(check_email=True)
+analyzer = scanner.build_analyzer("npm", {"left-pad": ""})
+EmailChecker("npm", "left-pad")
+analyzer.domains.close()
+scanner.close()
+"""
+
+SCENARIOS = {"interpreter": [sys.executable, "-c", "pass"],
+             "help": [sys.executable, "main.py", "--no-banner", "--help"],
+             "graph_help": [sys.executable, "main.py", "graph", "paths", "--no-banner", "--help"],
+             "dependency": [sys.executable, "-c", DEPENDENCY_PROBE],
+             "check_email": [sys.executable, "-c", EMAIL_PROBE]}
+
+
+def measure(command, runs):
+    """
+    Method used to run a command several times, returns the fastest wall time in milliseconds and its output
+    """
+    best = None
+    output = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+        if process.returncode != 0:
+            sys.exit(f"[-] A startup run failed:\n{process.stderr}")
+        elapsed = (time.perf_counter() - start) * 1000
+        if best is None or elapsed < best:
+            best = elapsed
+        output = process.stdout
+    return best, output
+
+
+def compare(results, baseline, tolerance):
+    """
+    Method used to list the scenarios which got slower than the baseline by more than the tolerance
+    """
+    regressions = []
+    for scenario, duration in baseline.items():
+        if scenario in results and results[scenario] > duration * (1 + tolerance):
+            regressions.append(f"{scenario}: {results[scenario]:.1f}ms instead of {duration:.1f}ms")
+    return regressions
+
+
+def main():
+    """
+    Main method to launch the benchmark
+    """
+    parser = argparse.ArgumentParser(prog='bench_startup.py', description='Startup benchmark')
+    parser.add_argument('--runs',
+                        help="Number of runs of every scenario, the fastest one is kept",
+                        default=10,
+                        type=int)
+    parser.add_argument('--max-ms',
+                        help="Startup budget of a --dependency run in milliseconds, interpreter launch excluded",
+                        default=None,
+                        type=float)
+    parser.add_argument('--output',
+                        help="JSON file where the startup times are saved",
+                        default=None,
+                        type=str)
+    parser.add_argument('--baseline',
+                        help="JSON file saved by a previous run, the benchmark fails if a startup got slower",
+                        default=None,
+                        type=str)
+    parser.add_argument('--tolerance',
+                        help="Share of a baseline startup time which may be added without failing",
+                        default=0.2,
+                        type=float)
+    args = parser.parse_args()
+
+    results = {}
+    failures = []
+    for scenario, command in SCENARIOS.items():
+        results[scenario], output = measure(command, args.runs)
+        print(f"[+] {scenario:12} {results[scenario]:8.1f}ms")
+        if scenario == "dependency":
+            loaded = json.loads(output.strip().splitlines()[-1])
+            for name in loaded:
+                failures.append(f"{name} is imported by a --dependency run")
+    overhead = results["dependency"] - results["interpreter"]
+    print(f"[+] A --dependency run spends {overhead:.1f}ms importing depfu before its first request")
+    if args.max_ms is not None and overhead > args.max_ms:
+        failures.append(f"startup of a --dependency run took {overhead:.1f}ms, budget is {args.max_ms:.1f}ms")
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as fd:
+            json.dump(results, fd, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as fd:
+            baseline = json.load(fd)
+        # The interpreter itself is not depfu's startup, it only tells how noisy the machine is
+        baseline.pop("interpreter", None)
+        failures += [f"regression of {regression}" for regression in compare(results, baseline, args.tolerance)]
+    for failure in failures:
+        print(f"[-] {failure}")
+    if len(failures) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#! /usr/bin/env python3
+"""
+Microbenchmark of the dependency traversal over a synthetic graph with a stubbed session.
+It compares the previous list based stack walk with the Frontier used by AnalyzeDependencies.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.analyze_dependencies import AnalyzeDependencies
+from utils.misc import dependency_exists, recover_dependencies
+
+
+class StubResponse:
+    """
+    Class used to mimic the part of requests.Response read by the registry helpers
+    """
+
+    __slots__ = ("status_code", "data")
+
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class StubSession:
+    """
+    Class used to answer deps.dev requests from an in-memory graph
+    """
+
+    def __init__(self, nodes, fanout, missing_ratio, seed):
+        rng = random.Random(seed)
+        self.names = [f"pkg{i}" for i in range(nodes)]
+        self.missing = set(rng.sample(self.names, int(nodes * missing_ratio)))
+        self.graph = {}
+        for i, name in enumerate(self.names):
+            # Every node is reachable from pkg0 through pkg{i+1}, other edges go anywhere in the graph
+            children = [self.names[i + 1]] if i < nodes - 1 else []
+            children += [self.names[rng.randrange(nodes)] for _ in range(fanout - 1)]
+            children = [child for child in dict.fromkeys(children) if child != name]
+            deps = [{"package": {"name": name}, "version": "1.0.0"}]
+            deps += [{"package": {"name": child}, "version": "1.0.0"} for child in children]
+            self.graph[name] = StubResponse(200, {"dependencyCount": len(children), "dependencies": deps})
+        self.calls = 0
+
+    def get(self, url, **_):
+        self.calls += 1
+        parts = url.split("/")
+        if url.endswith("/dependencies"):
+            return self.graph[urllib.parse.unquote(parts[-4])]
+        return StubResponse(404 if urllib.parse.unquote(parts[-3]) in self.missing else 200)
+
+
+def legacy_walk(analyzer, root_package, root_version, budget):
+    """
+    Method used to replay the previous traversal, which rebuilt the list of queued names for every edge.
+    The walk stops after `budget` seconds since it is quadratic on wide graphs.
+    """
+    deadline = time.perf_counter() + budget
+    stack = [{root_package: root_version}]
+    while len(stack) != 0:
+        if time.perf_counter() > deadline:
+            return False
+        package, version = list(stack.pop().items())[0]
+        if dependency_exists(package, analyzer.provider, analyzer.session, analyzer.cache):
+            deps = recover_dependencies(package, version, analyzer.provider, analyzer.session, analyzer.cache)
+            analyzer.already_done[package] = version
+            for subpackage, subpackage_version in deps or []:
+                if (subpackage not in analyzer.already_done
+                    and subpackage not in [list(x.keys())[0] for x in stack]):
+                    stack.append({subpackage: subpackage_version})
+        else:
+            analyzer.already_done[package] = version
+            analyzer.takeover.setdefault(package, version)
+    return True
+
+
+def measure(name, session, walk):
+    """
+    Method used to time one traversal of the graph from its first node, returns the nodes per second
+    """
+    analyzer = AnalyzeDependencies("npm", {"pkg0": "1.0.0"}, False, None, False)
+    analyzer.session = session
+    session.calls = 0
+    start = time.perf_counter()
+    complete = walk(analyzer) is not False
+    elapsed = time.perf_counter() - start
+    rate = len(analyzer.already_done) / elapsed
+    print(f"[+] {name:<8} {elapsed:8.2f}s  {len(analyzer.already_done)} nodes  {rate:8.0f} nodes/s  "
+          f"{len(analyzer.takeover)} takeover  {session.calls} requests"
+          f"{'' if complete else '  (budget exhausted)'}")
+    return rate, complete, analyzer
+
+
+def main():
+    """
+    Main method to launch the benchmark
+    """
+    parser = argparse.ArgumentParser(prog='bench_traversal.py', description='Traversal microbenchmark')
+    parser.add_argument('--nodes', default=50000, type=int)
+    parser.add_argument('--fanout', default=8, type=int)
+    parser.add_argument('--missing-ratio', default=0.01, type=float)
+    parser.add_argument('--seed', default=1, type=int)
+    parser.add_argument('--legacy-budget',
+                        help="Seconds given to the legacy walk, 0 to skip it",
+                        default=30,
+                        type=float)
+    args = parser.parse_args()
+
+    session = StubSession(args.nodes, args.fanout, args.missing_ratio, args.seed)
+    print(f"[+] Synthetic graph of {args.nodes} nodes with a fan-out of {args.fanout}")
+    current, _, analyzer = measure("frontier", session,
+                                   lambda a: a.check_dependency("pkg0", "1.0.0"))
+    if args.legacy_budget > 0:
+        legacy, complete, legacy_analyzer = measure(
+            "legacy", session, lambda a: legacy_walk(a, "pkg0", "1.0.0", args.legacy_budget))
+        if complete and (legacy_analyzer.already_done != analyzer.already_done
+                         or legacy_analyzer.takeover != analyzer.takeover):
+            print("[-] Both traversals should visit the same packages !")
+            sys.exit(1)
+        # The legacy walk slows down as its stack grows, a partial run underestimates the speedup
+        print(f"[+] Speedup: x{current / legacy:.1f}{'' if complete else ' (at least)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#! /usr/bin/env python3
+"""
+Generator of synthetic monorepos whose manifests depend on the packages of the mock registry
+"""
+import os
+import sys
+import json
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_registry import format_name
+
+MONOREPO_PROVIDERS = ("npm", "pypi", "cargo", "go", "maven")
+PROJECTS_PER_FOLDER = 100
+
+
+def write_npm(directory, index, dependencies):
+    """
+    Method used to write the package.json of a project
+    """
+    with open(os.path.join(directory, "package.json"), "w", encoding="utf-8") as fd:
+        json.dump({"name": f"project{index}", "version": "1.0.0",
+                   "dependencies": {name: f"^{version}" for name, version in dependencies}}, fd, indent=2)
+
+
+def write_pypi(directory, index, dependencies):
+    """
+    Method used to write the requirements.txt of a project
+    """
+    with open(os.path.join(directory, "requirements.txt"), "w", encoding="utf-8") as fd:
+        fd.writelines(f"{name}=={version}\n" for name, version in dependencies)
+
+
+def write_cargo(directory, index, dependencies):
+    """
+    Method used to write the Cargo.toml of a project
+    """
+    with open(os.path.join(directory, "Cargo.toml"), "w", encoding="utf-8") as fd:
+        fd.write(f'[package]\nname = "project{index}"\nversion = "1.0.0"\n\n[dependencies]\n')
+        fd.writelines(f'{name} = "{version}"\n' for name, version in dependencies)
+
+
+def write_go(directory, index, dependencies):
+    """
+    Method used to write the go.mod of a project
+    """
+    with open(os.path.join(directory, "go.mod"), "w", encoding="utf-8") as fd:
+        fd.write(f"module example.org/project{index}\n\ngo 1.22\n\nrequire (\n")
+        fd.writelines(f"\t{name} v{version}\n" for name, version in dependencies)
+        fd.write(")\n")
+
+
+def write_maven(directory, index, dependencies):
+    """
+    Method used to write the pom.xml of a project
+    """
+    with open(os.path.join(directory, "pom.xml"), "w", encoding="utf-8") as fd:
+        fd.write("<project>\n  <modelVersion>4.0.0</modelVersion>\n  <groupId>org.bench</groupId>\n"
+                 f"  <artifactId>project{index}</artifactId>\n  <version>1.0.0</version>\n  <dependencies>\n")
+        for name, version in dependencies:
+            group_id, artifact_id = name.split(":")
+            fd.write(f"    <dependency>\n      <groupId>{group_id}</groupId>\n"
+                     f"      <artifactId>{artifact_id}</artifactId>\n      <version>{version}</version>\n"
+                     "    </dependency>\n")
+        fd.write("  </dependencies>\n</project>\n")
+
+
+WRITERS = {"npm": write_npm, "pypi": write_pypi, "cargo": write_cargo, "go": write_go, "maven": write_maven}
+
+
+def generate_monorepo(path, manifests, dependencies=5, packages=5000, providers=MONOREPO_PROVIDERS, seed=1):
+    """
+    Method used to write a monorepo of projects, each with one manifest of a provider taken in turn.
+    Declared dependencies are drawn from the first tenth of the registry so that graphs overlap.
+    Returns the number of manifests written per provider.
+    """
+    rng = random.Random(seed)
+    written = {provider: 0 for provider in providers}
+    roots = max(1, packages // 10)
+    for index in range(manifests):
+        provider = providers[index % len(providers)]
+        directory = os.path.join(path, f"team{index // PROJECTS_PER_FOLDER}", f"project{index}")
+        os.makedirs(directory, exist_ok=True)
+        declared = [(format_name(provider, package_id), "1.0.0")
+                    for package_id in sorted({rng.randrange(roots) for _ in range(dependencies)})]
+        WRITERS[provider](directory, index, declared)
+        written[provider] += 1
+    return written
+
+
+def main():
+    """
+    Main method to write a synthetic monorepo
+    """
+    parser = argparse.ArgumentParser(prog='generate_monorepo.py', description='Synthetic monorepo generator')
+    parser.add_argument('--output', required=True, type=str)
+    parser.add_argument('--manifests', default=1000, type=int)
+    parser.add_argument('--dependencies',
+                        help="Number of dependencies declared by every manifest",
+                        default=5,
+                        type=int)
+    parser.add_argument('--packages',
+                        help="Number of packages in the synthetic registry",
+                        default=5000,
+                        type=int)
+    parser.add_argument('--providers',
+                        default=",".join(MONOREPO_PROVIDERS),
+                        type=str)
+    parser.add_argument('--seed', default=1, type=int)
+    args = parser.parse_args()
+
+    written = generate_monorepo(args.output, args.manifests, args.dependencies, args.packages,
+                                args.providers.split(","), args.seed)
+    print(f"[+] Wrote {sum(written.values())} manifests to {args.output}: "
+          + ", ".join(f"{count} {provider}" for provider, count in written.items()))
+
+
+if __name__ == "__main__":
+    main()
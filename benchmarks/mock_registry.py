@@ -0,0 +1,264 @@
+#! /usr/bin/env python3
+"""
+Local stand-in for the registries queried by depfu, answering from a synthetic dependency graph.
+It mimics the deps.dev, search.maven.org, npm and pypi endpoints with configurable latency and throttling.
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REGISTRY_HOSTS = ("deps.dev", "search.maven.org", "registry.npmjs.org", "pypi.org")
+PACKAGE_ID = re.compile(r'pkg(\d+)$')
+SOLR_COORDINATES = re.compile(r'g:"([^"]*)" AND a:"([^"]*)"')
+
+
+def format_name(provider, package_id):
+    """
+    Method used to name a synthetic package the way its ecosystem does
+    """
+    if provider == "go":
+        return f"example.com/pkg{package_id}"
+    if provider in ("maven", "gradle"):
+        return f"org.example:pkg{package_id}"
+    return f"pkg{package_id}"
+
+
+class SyntheticRegistry:
+    """
+    Class used to describe a deterministic graph of packages, shared by every ecosystem.
+    Package pkg<i> depends on packages with a greater id, so the graph has no cycle.
+    """
+
+    def __init__(self, packages, fanout, missing_ratio=0.01, seed=1):
+        self.packages = packages
+        self.fanout = fanout
+        self.seed = seed
+        rng = random.Random(seed)
+        self.missing = set(rng.sample(range(packages), int(packages * missing_ratio)))
+
+    def package_id(self, name):
+        """
+        Method used to recover the id of a package, None if it is not part of the graph
+        """
+        match = PACKAGE_ID.search(name)
+        if match is None or int(match.group(1)) >= self.packages:
+            return None
+        return int(match.group(1))
+
+    def exists(self, name):
+        """
+        Method used to know if a package is published
+        """
+        package_id = self.package_id(name)
+        return package_id is not None and package_id not in self.missing
+
+    def children(self, package_id):
+        """
+        Method used to recover the ids a package depends on
+        """
+        if package_id + 1 >= self.packages:
+            return []
+        rng = random.Random(f"{self.seed}:{package_id}")
+        return sorted({rng.randrange(package_id + 1, self.packages) for _ in range(self.fanout)})
+
+    def dependencies(self, provider, name, version):
+        """
+        Method used to recover the dependency graph of a package as deps.dev answers it
+        """
+        deps = [{"package": {"name": name}, "version": version}]
+        deps += [{"package": {"name": format_name(provider, child)}, "version": "1.0.0"}
+                 for child in self.children(self.package_id(name))]
+        return {"dependencyCount": len(deps) - 1, "dependencies": deps}
+
+
+class RegistryHandler(BaseHTTPRequestHandler):
+    """
+    Class used to answer registry requests from the synthetic graph of the server
+    """
+
+    # Connections are kept alive like on the real registries
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, Nagle would delay every answer
+    disable_nagle_algorithm = True
+
+    def send_json(self, status, data=None, headers=None):
+        """
+        Method used to send a JSON answer
+        """
+        body = json.dumps(data if data is not None else {}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if self.path == "/_stats":
+            self.send_json(200, server.counters)
+            return
+        server.count("requests")
+        if server.latency > 0:
+            time.sleep(server.latency)
+        if server.throttle_ratio > 0 and server.roll() < server.throttle_ratio:
+            server.count("throttled")
+            self.send_json(429, headers={"Retry-After": str(server.retry_after)})
+            return
+        url = urllib.parse.urlsplit(self.path)
+        parts = [urllib.parse.unquote(part) for part in url.path.split("/")]
+        registry = server.registry
+        if url.path.startswith("/_/s/") and len(parts) >= 7:
+            # /_/s/<provider>/p/<name>/v/[<version>/dependencies]
+            provider, name = parts[3], parts[5]
+            if not registry.exists(name):
+                self.send_json(404)
+            elif url.path.endswith("/dependencies"):
+                self.send_json(200, registry.dependencies(provider, name, parts[7]))
+            else:
+                self.send_json(200, {"package": {"name": name}})
+        elif url.path == "/solrsearch/select":
+            query = urllib.parse.parse_qs(url.query).get("q", [""])[0]
+            docs = [{"g": group_id, "a": artifact_id}
+                    for group_id, artifact_id in SOLR_COORDINATES.findall(query)
+                    if registry.exists(f"{group_id}:{artifact_id}")]
+            self.send_json(200, {"response": {"numFound": len(docs), "docs": docs}})
+        elif url.path.startswith("/pypi/") and len(parts) >= 4:
+            if registry.exists(parts[2]):
+                self.send_json(200, {"info": {"name": parts[2], "author_email": "dev@example.com"}})
+            else:
+                self.send_json(404)
+        elif registry.exists(parts[-1]):
+            self.send_json(200, {"name": parts[-1], "maintainers": [{"email": "dev@example.com"}]})
+        else:
+            self.send_json(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockRegistry(ThreadingHTTPServer):
+    """
+    Class used to serve a SyntheticRegistry on a local port, requests and throttled answers are counted
+    """
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, registry, host="127.0.0.1", port=0, latency=0.0, throttle_ratio=0.0, retry_after=0):
+        super().__init__((host, port), RegistryHandler)
+        self.registry = registry
+        self.latency = latency
+        self.throttle_ratio = throttle_ratio
+        self.retry_after = retry_after
+        self.counters = {"requests": 0, "throttled": 0}
+        self.rng = random.Random(registry.seed)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def base_urls(self):
+        """
+        Method used to recover the overrides sending every registry host to this server
+        """
+        return {host: self.url for host in REGISTRY_HOSTS}
+
+    def count(self, counter):
+        """
+        Method used to increment a counter
+        """
+        with self.lock:
+            self.counters[counter] += 1
+
+    def roll(self):
+        """
+        Method used to draw a number in [0, 1) for the throttling decision
+        """
+        with self.lock:
+            return self.rng.random()
+
+    def start(self):
+        """
+        Method used to serve requests in a background thread
+        """
+        self.thread = threading.Thread(target=self.serve_forever, name="mock-registry", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Method used to stop serving requests
+        """
+        self.shutdown()
+        self.server_close()
+
+
+def add_registry_arguments(parser):
+    """
+    Method used to declare the options describing the synthetic registry
+    """
+    parser.add_argument('--packages',
+                        help="Number of packages in the synthetic registry",
+                        default=5000,
+                        type=int)
+    parser.add_argument('--fanout',
+                        help="Number of dependencies of every package",
+                        default=4,
+                        type=int)
+    parser.add_argument('--missing-ratio',
+                        help="Share of packages which are not published",
+                        default=0.01,
+                        type=float)
+    parser.add_argument('--latency',
+                        help="Seconds waited before answering every request",
+                        default=0.0,
+                        type=float)
+    parser.add_argument('--throttle-ratio',
+                        help="Share of requests answered with a 429",
+                        default=0.0,
+                        type=float)
+    parser.add_argument('--retry-after',
+                        help="Retry-After header of the 429 answers, in seconds",
+                        default=0,
+                        type=int)
+    parser.add_argument('--seed', default=1, type=int)
+
+
+def main():
+    """
+    Main method to serve the synthetic registry until interrupted
+    """
+    parser = argparse.ArgumentParser(prog='mock_registry.py', description='Local registry stand-in')
+    parser.add_argument('--port',
+                        help="Port to listen on, 0 to pick a free one",
+                        default=8080,
+                        type=int)
+    add_registry_arguments(parser)
+    args = parser.parse_args()
+
+    registry = SyntheticRegistry(args.packages, args.fanout, args.missing_ratio, args.seed)
+    server = MockRegistry(registry, port=args.port, latency=args.latency,
+                          throttle_ratio=args.throttle_ratio, retry_after=args.retry_after)
+    print(f"[+] Serving {args.packages} synthetic packages on {server.url}, scan with :")
+    print("    " + " ".join(f"--registry-url {host}={url}" for host, url in server.base_urls().items()),
+          flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"[+] {server.counters['requests']} requests, {server.counters['throttled']} throttled")
+
+
+if __name__ == "__main__":
+    main()
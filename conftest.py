@@ -6,6 +6,8 @@ import tempfile
 import shutil
 import os
 import sys
+import threading
+import urllib.parse
 
 # Add the project root to the path
 sys.path.insert(0, os.path.dirname(__file__))
@@ -37,6 +39,46 @@ def mock_session():
     return MagicMock()
 
 
+class StubResponse:
+    """Part of requests.Response read by the registry helpers"""
+
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = {}
+
+    def json(self):
+        return self.data
+
+
+class StubRegistry:
+    """Session answering deps.dev requests from an in-memory graph of (name, version) -> [(name, version)]"""
+
+    def __init__(self, graph, missing=()):
+        self.graph = graph
+        self.missing = set(missing)
+        self.urls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, **_):
+        with self.lock:
+            self.urls.append(url)
+        parts = url.split("/")
+        if url.endswith("/dependencies"):
+            name, version = urllib.parse.unquote(parts[-4]), parts[-2]
+            deps = [{"package": {"name": name}, "version": version}]
+            deps += [{"package": {"name": dep}, "version": dep_version}
+                     for dep, dep_version in self.graph.get((name, version), [])]
+            return StubResponse(200, {"dependencyCount": len(deps) - 1, "dependencies": deps})
+        return StubResponse(404 if urllib.parse.unquote(parts[-3]) in self.missing else 200)
+
+
+@pytest.fixture
+def stub_registry():
+    """Build a stubbed deps.dev session from a dependency graph and the names missing from the registry"""
+    return StubRegistry
+
+
 def pytest_configure(config):
     """Configure pytest with custom markers"""
     config.addinivalue_line("markers", "unit: Unit tests")
@@ -2,20 +2,386 @@
 """
 Main script to analyze dependencies of a github organization
 """
+import os
+import sys
 import argparse
-from pyfiglet import Figlet
-from utils.recover_dependencies import RecoverDependencies
-from utils.analyze_dependencies import AnalyzeDependencies
+from utils.discovery import PRUNED_DIRECTORIES
+from utils.pipeline import PROVIDERS
 
-def main():
+def add_banner_argument(parser):
     """
-    Main method to launch the analysis
+    Method used to declare the option hiding the banner, shared by every command
+    """
+    parser.add_argument('--no-banner',
+                        help="Don't display the banner",
+                        action='store_true')
+
+def print_banner(args):
     """
+    Method used to display the banner unless --no-banner is given
+    """
+    if args.no_banner:
+        return
+    from pyfiglet import Figlet
     f = Figlet(font='doom')
     print(f.renderText('DepFuzzer'))
+
+def snapshot_main(argv):
+    """
+    Method used to build an offline registry snapshot
+    """
+    parser = argparse.ArgumentParser(prog='main.py snapshot', description='Registry snapshot builder')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Build the tables of one provider")
+    build_parser.add_argument('--output',
+                        help="Snapshot folder, tables of other providers are kept",
+                        required=True,
+                        type=str)
+    build_parser.add_argument('--provider',
+                        choices=PROVIDERS,
+                        required=True,
+                        type=str)
+    build_parser.add_argument('--names',
+                        help="File holding one existing package name per line",
+                        default=None,
+                        type=str)
+    build_parser.add_argument('--edges',
+                        help='JSON lines file of {"name", "version", "dependencies": [[name, version], ...]} records',
+                        default=None,
+                        type=str)
+    build_parser.add_argument('--from-cache',
+                        help="Registry cache folder whose answers are added to the snapshot",
+                        default=None,
+                        type=str)
+    add_banner_argument(build_parser)
+    args = parser.parse_args(argv)
+    print_banner(args)
+    if args.names is None and args.edges is None and args.from_cache is None:
+        build_parser.error("at least one of --names, --edges or --from-cache is required")
+    from utils.snapshot import build_snapshot
+    names, edges = build_snapshot(args.output, args.provider, args.names, args.edges, args.from_cache)
+    print(f"[+] Snapshot of {args.provider} written to {args.output}: {names} packages, {edges} dependency lists")
+
+def known_packages_main(argv):
+    """
+    Method used to build the filters of packages known to be published
+    """
+    from utils.bloom import build_known_packages, DEFAULT_FALSE_POSITIVE_RATE
+    parser = argparse.ArgumentParser(prog='main.py known-packages', description='Known packages filter builder')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Build the filter of one provider")
+    build_parser.add_argument('--output',
+                        help="Folder of the filters, filters of other providers are kept",
+                        required=True,
+                        type=str)
+    build_parser.add_argument('--provider',
+                        choices=PROVIDERS,
+                        required=True,
+                        type=str)
+    build_parser.add_argument('--names',
+                        help="File holding one published package name per line",
+                        default=None,
+                        type=str)
+    build_parser.add_argument('--from-cache',
+                        help="Registry cache folder whose existing packages are added to the filter",
+                        default=None,
+                        type=str)
+    build_parser.add_argument('--from-snapshot',
+                        help="Registry snapshot folder whose names are added to the filter",
+                        default=None,
+                        type=str)
+    build_parser.add_argument('--false-positive-rate',
+                        help="Probability that a package which is not published is skipped anyway",
+                        default=DEFAULT_FALSE_POSITIVE_RATE,
+                        type=float)
+    add_banner_argument(build_parser)
+    args = parser.parse_args(argv)
+    print_banner(args)
+    if args.names is None and args.from_cache is None and args.from_snapshot is None:
+        build_parser.error("at least one of --names, --from-cache or --from-snapshot is required")
+    if not 0 < args.false_positive_rate < 1:
+        build_parser.error("--false-positive-rate must be between 0 and 1")
+    names = build_known_packages(args.output, args.provider, args.names, args.from_cache,
+                                 args.from_snapshot, args.false_positive_rate)
+    print(f"[+] Filter of {args.provider} written to {args.output}: {names} known packages")
+
+def graph_main(argv):
+    """
+    Method used to query a dependency graph saved by --export-graph
+    """
+    parser = argparse.ArgumentParser(prog='main.py graph', description='Dependency graph explorer')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    paths_parser = subparsers.add_parser('paths', help="Show how the declared packages pull in a package")
+    paths_parser.add_argument('--graph',
+                        help="File written by --export-graph",
+                        required=True,
+                        type=str)
+    paths_parser.add_argument('--package',
+                        help="Name of the package to explain",
+                        required=True,
+                        type=str)
+    paths_parser.add_argument('--provider',
+                        help="Only look at the graph of this provider",
+                        choices=PROVIDERS,
+                        default=None,
+                        type=str)
+    paths_parser.add_argument('--limit',
+                        help="Maximum number of paths displayed per provider",
+                        default=10,
+                        type=int)
+    add_banner_argument(paths_parser)
+    args = parser.parse_args(argv)
+    print_banner(args)
+    from utils.graph import load_graphs
+    graphs = load_graphs(args.graph)
+    found = False
+    for provider, graph in graphs.items():
+        if args.provider is not None and provider != args.provider:
+            continue
+        paths = graph.paths_to(args.package, args.limit)
+        if len(paths) == 0:
+            continue
+        found = True
+        print(f"[+] {provider}: {args.package} is pulled in by")
+        for path in paths:
+            print("    " + " -> ".join(path))
+    if not found:
+        print(f"[-] {args.package} isn't reachable from a declared package in {args.graph}")
+
+def add_client_arguments(parser):
+    """
+    Method used to declare the options of the registry client, shared by scans and the service
+    """
+    from utils.analyze_dependencies import GRAPH_MODES
+    from utils.cache import DEFAULT_TTL, DEFAULT_MAX_ENTRIES
+    from utils.http_client import registry_url, DEFAULT_RATE, DEFAULT_HOST_CONCURRENCY
+    parser.add_argument('--check-email',
+                        help="Check if the email's owner of the dependency exists. Might be longer to analyze.",
+                        default=False,
+                        type=bool)
+    parser.add_argument('--concurrency',
+                        help="Maximum number of registry requests in flight while resolving dependencies",
+                        default=1,
+                        type=int)
+    parser.add_argument('--graph-mode',
+                        help="""recursive fetches the dependency graph of every package,
+                        resolved only fetches the graph of declared dependencies and checks every node it contains""",
+                        choices=GRAPH_MODES,
+                        default="recursive",
+                        type=str)
+    parser.add_argument('--rate-limit',
+                        help="Maximum number of requests per second sent to one registry host, lowered automatically when the host throttles",
+                        default=DEFAULT_RATE,
+                        type=float)
+    parser.add_argument('--host-concurrency',
+                        help="Maximum number of requests in flight to one registry host, shared by every provider",
+                        default=DEFAULT_HOST_CONCURRENCY,
+                        type=int)
+    parser.add_argument('--registry-url',
+                        help="Send the requests of a registry host to another server, as HOST=URL (e.g. deps.dev=http://127.0.0.1:8080). Can be repeated",
+                        action='append',
+                        default=None,
+                        type=registry_url)
+    parser.add_argument('--cache-dir',
+                        help="Folder where registry answers are cached between runs (in memory if not set)",
+                        default=None,
+                        type=str)
+    parser.add_argument('--cache-ttl',
+                        help="Number of seconds a cached registry answer stays valid, 0 to never expire",
+                        default=DEFAULT_TTL,
+                        type=int)
+    parser.add_argument('--cache-max-entries',
+                        help="Maximum number of cached registry answers, the oldest ones are evicted first",
+                        default=DEFAULT_MAX_ENTRIES,
+                        type=int)
+
+def add_source_arguments(parser):
+    """
+    Method used to declare the options of registry sources and manifest discovery
+    """
+    parser.add_argument('--registry-snapshot',
+                        help="Snapshot folder answering registry lookups offline, built with 'main.py snapshot build'",
+                        default=None,
+                        type=str)
+    parser.add_argument('--known-packages',
+                        help="Folder of filters built with 'main.py known-packages build', listed packages are not checked",
+                        default=None,
+                        type=str)
+    parser.add_argument('--ignore-lockfiles',
+                        help="Only read manifests and resolve every dependency graph remotely, lockfiles are skipped",
+                        action='store_true')
+    parser.add_argument('--no-prune',
+                        help=f"Also look for manifests inside {', '.join(PRUNED_DIRECTORIES)} folders",
+                        action='store_true')
+    parser.add_argument('--parse-workers',
+                        help="Number of processes used to parse manifests, 0 to use every CPU",
+                        default=1,
+                        type=int)
+
+def build_scanner(args, cache):
+    """
+    Method used to create the scanner described by the command line options
+    """
+    from utils.scanner import Scanner
+    from utils.snapshot import RegistrySnapshot
+    from utils.bloom import KnownPackages
+    return Scanner(concurrency=args.concurrency,
+                   graph_mode=args.graph_mode,
+                   check_email=args.check_email,
+                   print_takeover=getattr(args, "print_takeover", False),
+                   rate=args.rate_limit,
+                   host_concurrency=args.host_concurrency,
+                   cache=cache,
+                   snapshot=RegistrySnapshot(args.registry_snapshot) if args.registry_snapshot is not None else None,
+                   known=KnownPackages(args.known_packages) if args.known_packages is not None else None,
+                   parse_workers=args.parse_workers,
+                   pruned=() if args.no_prune else PRUNED_DIRECTORIES,
+                   use_lockfiles=not args.ignore_lockfiles,
+                   base_urls=dict(args.registry_url or []))
+
+def org_main(argv):
+    """
+    Method used to scan many repositories at once, every shared package is checked once
+    """
+    from utils.cache import RegistryCache
+    from utils.incremental import IncrementalState
+    from utils.organization import OrganizationScan, load_repositories
+    parser = argparse.ArgumentParser(prog='main.py org', description='Organization dependency checker')
+    parser.add_argument('--provider',
+                        choices=PROVIDERS + ["all"],
+                        default="all",
+                        type=str)
+    parser.add_argument('--path',
+                        help="Repository to analyze. Can be repeated",
+                        action='append',
+                        default=[],
+                        type=str)
+    parser.add_argument('--repos-file',
+                        help="File holding one repository folder per line, relative to the file",
+                        default=None,
+                        type=str)
+    parser.add_argument('--repos-dir',
+                        help="Folder whose every subfolder is a repository",
+                        default=None,
+                        type=str)
+    parser.add_argument('--output-file',
+                        help="JSON file where findings are saved with the repositories and manifests declaring them",
+                        default=None,
+                        type=str)
+    parser.add_argument('--incremental',
+                        help="File remembering parsed manifests and resolved roots, unchanged ones are reused by the next scans for --cache-ttl seconds",
+                        default=None,
+                        type=str)
+    add_client_arguments(parser)
+    add_source_arguments(parser)
+    add_banner_argument(parser)
+    args = parser.parse_args(argv)
+    print_banner(args)
+    if len(args.path) == 0 and args.repos_file is None and args.repos_dir is None:
+        parser.error("at least one of --path, --repos-file or --repos-dir is required")
+    if args.registry_snapshot is not None and args.check_email:
+        parser.error("--check-email needs network access, it can't be used with --registry-snapshot")
+    repositories = load_repositories(args.path, args.repos_file, args.repos_dir)
+    cache = RegistryCache(args.cache_dir, args.cache_ttl, args.cache_max_entries)
+    incremental = None
+    if args.incremental is not None:
+        incremental = IncrementalState(args.incremental, args.cache_ttl)
+    scanner = build_scanner(args, cache)
+    providers = PROVIDERS if args.provider == "all" else [args.provider]
+    organization = OrganizationScan(scanner, repositories, providers)
+    print(f"[+] Scanning {len(repositories)} repositories")
+    organization.run(incremental)
+    findings = organization.findings()
+    for provider, counts in organization.summary().items():
+        print(f"[+] {provider}: {counts['declarations']} declarations of {counts['declared_packages']} packages, "
+              f"{counts['checked_packages']} packages checked")
+    for finding in findings:
+        print(f"[+] {finding['provider']}: {finding['package']} ({finding['version']}) might be taken over, declared by")
+        for declaration in finding["declared_by"]:
+            chain = " -> ".join(declaration["path"])
+            print(f"    {declaration['repository']}: {declaration['manifest']} ({chain})")
+    if len(findings) == 0:
+        print("[-] No package might be taken over")
+    if args.output_file is not None:
+        organization.save(args.output_file, findings)
+        print(f"[+] Results saved to {args.output_file}")
+    scanner.close()
+    if incremental is not None:
+        incremental.save()
+
+def serve_main(argv):
+    """
+    Method used to run the resident scanning service
+    """
+    from utils.cache import RegistryCache
+    from utils.metrics import METRICS
+    from utils.server import ScanService, serve, stale_socket, DEFAULT_WORKERS, DEFAULT_QUEUE_SIZE
+    parser = argparse.ArgumentParser(prog='main.py serve', description='Resident dependency checker')
+    listen_group = parser.add_mutually_exclusive_group(required=True)
+    listen_group.add_argument('--listen',
+                        help="host:port answering the HTTP API",
+                        default=None,
+                        type=str)
+    listen_group.add_argument('--socket',
+                        help="Unix socket answering the HTTP API",
+                        default=None,
+                        type=str)
+    parser.add_argument('--workers',
+                        help="Number of scans running at the same time",
+                        default=DEFAULT_WORKERS,
+                        type=int)
+    parser.add_argument('--queue-size',
+                        help="Number of scans waiting for a worker, more are refused with 503",
+                        default=DEFAULT_QUEUE_SIZE,
+                        type=int)
+    parser.add_argument('--metrics',
+                        help="Collect timings and counters, served in the Prometheus format on /metrics",
+                        action='store_true')
+    add_client_arguments(parser)
+    add_source_arguments(parser)
+    add_banner_argument(parser)
+    args = parser.parse_args(argv)
+    print_banner(args)
+    if args.registry_snapshot is not None and args.check_email:
+        parser.error("--check-email needs network access, it can't be used with --registry-snapshot")
+    if args.socket is not None and os.path.lexists(args.socket) and not stale_socket(args.socket):
+        parser.error(f"{args.socket} exists and is not a Unix socket")
+    if args.metrics:
+        METRICS.enable()
+    cache = RegistryCache(args.cache_dir, args.cache_ttl, args.cache_max_entries)
+    scanner = build_scanner(args, cache)
+    service = ScanService(scanner, workers=args.workers, queue_size=args.queue_size)
+    serve(service, listen=args.listen, socket_path=args.socket)
+    scanner.close()
+
+def main():
+    """
+    Main method to launch the analysis
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "snapshot":
+        snapshot_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "known-packages":
+        known_packages_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "org":
+        org_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "graph":
+        graph_main(sys.argv[2:])
+        return
+    from utils.cache import RegistryCache
+    from utils.output import JsonlWriter, OUTPUT_FORMATS
+    from utils.checkpoint import Checkpoint, DEFAULT_INTERVAL
+    from utils.incremental import IncrementalState
+    from utils.metrics import METRICS
+    from utils.graph import export_graphs
     parser = argparse.ArgumentParser(prog='main.py', description='Dependency checker')
     parser.add_argument('--provider',
-                        choices=["npm","pypi","cargo","go","maven","gradle","rubygems","all"],
+                        choices=PROVIDERS + ["all"],
                         required=True,
                         type=str)
 
@@ -38,20 +404,71 @@ def main():
                         help="File where results will be stored",
                         default=None,
                         type=str)
-    parser.add_argument('--check-email',
-                        help="Check if the email's owner of the dependency exists. Might be longer to analyze.",
-                        default=False,
-                        type=bool)
+    parser.add_argument('--output-format',
+                        help="jsonl appends one JSON record per finding to the output file as soon as it is found",
+                        choices=OUTPUT_FORMATS,
+                        default="text",
+                        type=str)
+    add_client_arguments(parser)
+    parser.add_argument('--checkpoint',
+                        help="File where the scan state is periodically saved so that it can be resumed",
+                        default=None,
+                        type=str)
+    parser.add_argument('--checkpoint-interval',
+                        help="Number of seconds between two checkpoint writes",
+                        default=DEFAULT_INTERVAL,
+                        type=int)
+    parser.add_argument('--resume',
+                        help="Checkpoint file of an interrupted scan to continue, it keeps being updated",
+                        default=None,
+                        type=str)
+    parser.add_argument('--incremental',
+                        help="File remembering parsed manifests and resolved roots, unchanged ones are reused by the next scans for --cache-ttl seconds",
+                        default=None,
+                        type=str)
+    parser.add_argument('--stats',
+                        help="Display where the time of the scan went: phases, registry latencies, cache hit ratios",
+                        action='store_true')
+    parser.add_argument('--metrics-file',
+                        help="JSON file where every timing, counter and the frontier size over time are saved",
+                        default=None,
+                        type=str)
+    parser.add_argument('--export-graph',
+                        help="File where the walked dependency graphs are saved, gzip compressed if it ends with .gz",
+                        default=None,
+                        type=str)
+    add_source_arguments(parser)
+    add_banner_argument(parser)
 
     args = parser.parse_args()
+    print_banner(args)
+    if args.output_format == "jsonl" and args.output_file is None:
+        parser.error("--output-format jsonl requires --output-file")
+    if args.registry_snapshot is not None and args.check_email:
+        parser.error("--check-email needs network access, it can't be used with --registry-snapshot")
+    checkpoint = None
+    if args.resume is not None:
+        checkpoint = Checkpoint.load(args.resume, args.checkpoint_interval)
+        if args.checkpoint is not None:
+            checkpoint.path = args.checkpoint
+    elif args.checkpoint is not None:
+        checkpoint = Checkpoint(args.checkpoint, args.checkpoint_interval)
+    stream = None
+    if args.output_format == "jsonl":
+        stream = JsonlWriter(args.output_file, append=args.resume is not None)
+    elif args.output_file is not None and args.resume is None:
+        # Every provider appends its results, the file only holds this run
+        open(args.output_file, "w", encoding="utf-8").close()
+    if args.stats or args.metrics_file is not None:
+        METRICS.enable()
+    cache = RegistryCache(args.cache_dir, args.cache_ttl, args.cache_max_entries)
+    incremental = None
+    if args.incremental is not None:
+        incremental = IncrementalState(args.incremental, args.cache_ttl)
+    scanner = build_scanner(args, cache)
 
-    dependencies_to_check = {}
-    if args.path is not None:
-        if args.provider != "all":
-            rd = RecoverDependencies(args.path, args.provider)
-            rd.run()
-            dependencies_to_check = rd.dependencies
-    else:
+    dependencies_to_check = None
+    if args.dependency is not None:
         if ":" in args.dependency:
             splitted = args.dependency.split(":")
             name = splitted[0]
@@ -61,31 +478,36 @@ def main():
             version = ""
         dependencies_to_check = {name: version}
 
-    if args.provider == "all":
-        providers = ["npm","pypi","cargo","go","maven","gradle","rubygems"]
-        for provider in providers:
-            rd = RecoverDependencies(args.path, provider)
-            rd.run()
-            dependencies_to_check = rd.dependencies
-            if len(dependencies_to_check) > 0:
-                analyze = AnalyzeDependencies(provider,
-                dependencies_to_check,
-                args.print_takeover,
-                args.output_file,
-                args.check_email)
-                analyze.run()
-            else:
-                print(f"[-] No package for {provider} found.")
-    else:
-        if len(dependencies_to_check) > 0:
-            analyze = AnalyzeDependencies(args.provider,
-                                        dependencies_to_check,
-                                        args.print_takeover,
-                                        args.output_file,
-                                        args.check_email)
-            analyze.run()
-        else:
-            print(f"[-] No package for {args.provider} found.")
+    analyzers = scanner.scan(args.provider, path=args.path, dependencies=dependencies_to_check,
+                             output=args.output_file, stream=stream, checkpoint=checkpoint,
+                             incremental=incremental)
+    for provider, analyzer in analyzers.items():
+        if args.provider == "all":
+            print(f"[+] Results for {provider}:")
+        analyzer.report()
+
+    if args.export_graph is not None:
+        export_graphs(args.export_graph, analyzers)
+        print(f"[+] Dependency graphs saved to {args.export_graph}")
+
+    stats = cache.stats()
+    print(f"[+] Registry cache: {stats['hits']} hits, {stats['misses']} misses ({stats['expired']} expired)")
+    if scanner.known is not None:
+        print(f"[+] Known packages: {scanner.known.hits} existence checks skipped")
+    scanner.close()
+    if incremental is not None:
+        incremental.save()
+        print(f"[+] Incremental scan: {incremental.reused_manifests} manifests and "
+              f"{incremental.reused_roots} roots reused from {args.incremental}")
+    if stream is not None:
+        stream.close()
+    if args.stats:
+        print("[+] Scan statistics:")
+        for line in METRICS.summary():
+            print(f"    {line}")
+    if args.metrics_file is not None:
+        METRICS.dump(args.metrics_file)
+        print(f"[+] Metrics saved to {args.metrics_file}")
 
 if __name__ == "__main__":
     main()
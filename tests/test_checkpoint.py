@@ -0,0 +1,92 @@
+"""
+Tests of the checkpoints used to resume long scans
+"""
+import os
+import pytest
+from utils.analyze_dependencies import AnalyzeDependencies
+from utils.checkpoint import Checkpoint
+
+GRAPH = {("app", "1.0.0"): [("web", "2.0.0"), ("db", "1.0.0")],
+         ("web", "2.0.0"): [("router", "1.1.0"), ("gone", "0.1.0")],
+         ("router", "1.1.0"): [("parser", "3.0.0")],
+         ("parser", "3.0.0"): [("lost", "1.0.0")],
+         ("db", "1.0.0"): [("driver", "5.0.0")],
+         ("driver", "5.0.0"): [("parser", "3.0.0")],
+         ("cli", "0.2.0"): [("router", "1.1.0"), ("args", "1.0.0")]}
+MISSING = {"gone", "lost"}
+ROOTS = {"app": "1.0.0", "cli": "0.2.0"}
+
+
+class Killed(Exception):
+    """Raised to stop a scan the way a killed process would"""
+
+
+class KilledCheckpoint(Checkpoint):
+    """Checkpoint written after every package, the scan is killed once `saves` were written"""
+
+    def __init__(self, path, saves):
+        super().__init__(path, interval=0)
+        self.saves = saves
+
+    def save(self):
+        super().save()
+        self.saves -= 1
+        if self.saves == 0:
+            raise Killed()
+
+
+def analyzer(stub, checkpoint=None, concurrency=1):
+    """Build an analyzer of the roots over the stubbed registry"""
+    return AnalyzeDependencies("npm", dict(ROOTS), False, None, False, concurrency=concurrency,
+                               session=stub(GRAPH, MISSING), checkpoint=checkpoint)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("saves", [1, 3, 6])
+def test_resumed_scan_keeps_the_paths(stub_registry, temp_directory, saves):
+    expected = analyzer(stub_registry)
+    expected.analyze()
+    path = os.path.join(temp_directory, "scan.ckpt")
+    with pytest.raises(Killed):
+        analyzer(stub_registry, KilledCheckpoint(path, saves)).analyze()
+    resumed = analyzer(stub_registry, Checkpoint.load(path))
+    resumed.analyze()
+    for package in MISSING:
+        assert resumed.graph.paths_to(package) == expected.graph.paths_to(package)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("concurrency", [1, 8])
+@pytest.mark.parametrize("saves", [1, 2, 4, 7, 9])
+def test_resumed_scan_finds_what_an_uninterrupted_scan_finds(stub_registry, temp_directory, saves,
+                                                             concurrency):
+    expected = analyzer(stub_registry)
+    expected.analyze()
+    path = os.path.join(temp_directory, "scan.ckpt")
+    with pytest.raises(Killed):
+        analyzer(stub_registry, KilledCheckpoint(path, saves), concurrency).analyze()
+    resumed = analyzer(stub_registry, Checkpoint.load(path), concurrency)
+    resumed.analyze()
+    assert resumed.takeover == expected.takeover
+    assert resumed.unchecked == expected.unchecked == {}
+    assert dict(resumed.already_done) == dict(expected.already_done)
+
+
+@pytest.mark.unit
+def test_finished_scan_is_not_walked_again(stub_registry, temp_directory):
+    path = os.path.join(temp_directory, "scan.ckpt")
+    finished = analyzer(stub_registry, Checkpoint(path))
+    finished.analyze()
+    resumed = analyzer(stub_registry, Checkpoint.load(path))
+    resumed.analyze()
+    assert resumed.session.urls == []
+    assert resumed.takeover == finished.takeover
+
+
+@pytest.mark.unit
+def test_checkpoint_of_another_version_is_refused(temp_directory):
+    path = os.path.join(temp_directory, "scan.ckpt")
+    checkpoint = Checkpoint(path, state={"version": 0, "providers": {}})
+    checkpoint.save()
+    with pytest.raises(ValueError):
+        Checkpoint.load(path)
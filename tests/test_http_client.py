@@ -0,0 +1,113 @@
+"""
+Tests of the retries and backoff of the HTTP client
+"""
+import email.utils
+import time
+import pytest
+import requests
+from utils import http_client
+from utils.http_client import HttpClient, RateLimitError, MAX_BACKOFF, parse_retry_after
+
+
+class ScriptedResponse:
+    """Response with a status and headers"""
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class ScriptedSession:
+    """Session answering every request with the next scripted response, exceptions are raised"""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.urls = []
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def get(self, url, **_):
+        self.urls.append(url)
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the monotonic clock and sleep by a fake clock, returns the list of pauses"""
+    now = [1000.0]
+    pauses = []
+
+    def sleep(seconds):
+        pauses.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(http_client.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(http_client.time, "sleep", sleep)
+    return pauses
+
+
+def client(answers, retries=3):
+    """Build a client over scripted answers"""
+    return HttpClient(rate=1000, retries=retries, backoff=2.0, session=ScriptedSession(answers))
+
+
+@pytest.mark.unit
+class TestThrottling:
+    """Tests of 429 and 503 answers"""
+
+    def test_retry_after_seconds(self, clock):
+        http = client([ScriptedResponse(429, {"Retry-After": "7"}), ScriptedResponse(200)])
+        assert http.get("https://registry.example/a").status_code == 200
+        assert sum(clock) == pytest.approx(7.0)
+        assert http.limiters["registry.example"].rate < 1000
+
+    def test_retry_after_is_bounded(self, clock):
+        http = client([ScriptedResponse(503, {"Retry-After": "86400"}), ScriptedResponse(200)])
+        http.get("https://registry.example/a")
+        assert sum(clock) == pytest.approx(MAX_BACKOFF)
+
+    def test_backoff_without_retry_after(self, clock, monkeypatch):
+        monkeypatch.setattr(http_client.random, "uniform", lambda low, high: high)
+        http = client([ScriptedResponse(429), ScriptedResponse(429), ScriptedResponse(200)])
+        http.get("https://registry.example/a")
+        # backoff * 2 ** attempt, with the jitter at its upper bound
+        assert clock == pytest.approx([2.0, 4.0])
+
+    def test_rate_limit_error_after_every_retry(self, clock):
+        http = client([ScriptedResponse(429, {"Retry-After": "1"})] * 4, retries=3)
+        with pytest.raises(RateLimitError) as error:
+            http.get("https://registry.example/a")
+        assert error.value.response.status_code == 429
+        assert len(http.session.urls) == 4
+
+    def test_other_hosts_are_not_paused(self, clock):
+        http = client([ScriptedResponse(429, {"Retry-After": "60"}), ScriptedResponse(200)], retries=0)
+        with pytest.raises(RateLimitError):
+            http.get("https://slow.example/a")
+        assert http.get("https://fast.example/b").status_code == 200
+        assert sum(clock) == 0
+
+
+@pytest.mark.unit
+def test_network_errors_are_retried(clock, monkeypatch):
+    monkeypatch.setattr(http_client.random, "uniform", lambda low, high: high)
+    http = client([requests.ConnectionError(), requests.Timeout(), ScriptedResponse(200)])
+    assert http.get("https://registry.example/a").status_code == 200
+    assert clock == pytest.approx([2.0, 4.0])
+    http = client([requests.ConnectionError()] * 2, retries=1)
+    with pytest.raises(requests.ConnectionError):
+        http.get("https://registry.example/a")
+
+
+@pytest.mark.unit
+def test_parse_retry_after():
+    assert parse_retry_after(ScriptedResponse(429, {"Retry-After": "12"})) == 12.0
+    assert parse_retry_after(ScriptedResponse(429, {"Retry-After": "-3"})) == 0.0
+    assert parse_retry_after(ScriptedResponse(429, {"Retry-After": "soon"})) is None
+    assert parse_retry_after(ScriptedResponse(429)) is None
+    date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= parse_retry_after(ScriptedResponse(429, {"Retry-After": date})) <= 30
@@ -0,0 +1,160 @@
+"""
+Tests of the state reused between two incremental scans
+"""
+import os
+import json
+import threading
+import time
+import pytest
+from utils import incremental
+from utils.analyze_dependencies import AnalyzeDependencies
+from utils.incremental import IncrementalState
+from utils.output import JsonlWriter
+from utils.recover_dependencies import RecoverDependencies
+
+
+GRAPH = {("app", "1.0.0"): [("web", "2.0.0"), ("db", "1.0.0")],
+         ("web", "2.0.0"): [("router", "1.1.0"), ("gone", "0.1.0")],
+         ("router", "1.1.0"): [("lost", "1.0.0")],
+         ("db", "1.0.0"): [("driver", "5.0.0")],
+         ("cli", "0.2.0"): [("router", "1.1.0"), ("args", "1.0.0")]}
+MISSING = {"gone", "lost"}
+ROOTS = {"app": "1.0.0", "cli": "0.2.0"}
+
+
+def scan(session, roots, state_path, output_path, ttl=0):
+    """Run a scan of the roots with the incremental state, returns the analyzer and the state"""
+    state = IncrementalState(state_path, ttl)
+    writer = JsonlWriter(output_path)
+    analyzer = AnalyzeDependencies("npm", roots, False, None, False, session=session,
+                                   incremental=state, stream=writer)
+    # A cycle of parents would never end, the walk runs aside so that the test fails instead of hanging
+    walk = threading.Thread(target=analyzer.analyze, daemon=True)
+    walk.start()
+    walk.join(10)
+    writer.close()
+    assert not walk.is_alive(), "the scan did not end"
+    state.save()
+    return analyzer, state
+
+
+def read_findings(path):
+    """Read the findings streamed to a JSON lines file, without their timestamps"""
+    with open(path, "r", encoding="utf-8") as fd:
+        records = [json.loads(line) for line in fd]
+    for record in records:
+        record.pop("timestamp")
+    return records
+
+
+@pytest.mark.unit
+class TestRootReuse:
+    """Tests of the replay of resolved roots"""
+
+    def test_replayed_parents_never_close_a_cycle(self, stub_registry, temp_directory):
+        graph = {("R", "1"): [("X", "1")],
+                 ("X", "1"): [("Y", "1"), ("T", "1")],
+                 ("Y", "1"): [("X", "2")],
+                 ("X", "2"): []}
+        state_path = os.path.join(temp_directory, "state.json.gz")
+        output_path = os.path.join(temp_directory, "findings.jsonl")
+        scan(stub_registry(graph, {"T"}), {"R": "1", "Y": "1"}, state_path, output_path)
+        # Y reaches X first, R's parent links towards X can't be replayed and R is walked again
+        analyzer, state = scan(stub_registry(graph, {"T"}), {"Y": "1", "R": "1"}, state_path, output_path)
+        assert analyzer.parent_chain("X") == ["Y"]
+        assert state.reused_roots == 0
+
+    def test_unchanged_roots_are_replayed(self, stub_registry, temp_directory):
+        state_path = os.path.join(temp_directory, "state.json.gz")
+        output_path = os.path.join(temp_directory, "findings.jsonl")
+        first, _ = scan(stub_registry(GRAPH, MISSING), ROOTS, state_path, output_path)
+        first_findings = read_findings(output_path)
+        second, state = scan(stub_registry(GRAPH, MISSING), ROOTS, state_path, output_path)
+        assert second.session.urls == []
+        assert state.reused_roots == 2
+        assert second.takeover == first.takeover == {"gone": "0.1.0", "lost": "1.0.0"}
+        assert dict(second.already_done) == dict(first.already_done)
+        assert read_findings(output_path) == first_findings
+
+    def test_new_roots_are_walked(self, stub_registry, temp_directory):
+        state_path = os.path.join(temp_directory, "state.json.gz")
+        output_path = os.path.join(temp_directory, "findings.jsonl")
+        scan(stub_registry(GRAPH, MISSING), {"app": "1.0.0"}, state_path, output_path)
+        analyzer, state = scan(stub_registry(GRAPH, MISSING), ROOTS, state_path, output_path)
+        assert state.reused_roots == 1
+        # router was reached by the replayed root, only the new part of the graph is requested
+        assert sorted(url.split("/")[7] for url in analyzer.session.urls if url.endswith("/v/")) == [
+            "args", "cli"]
+
+    def test_expired_roots_are_walked_again(self, stub_registry, temp_directory, monkeypatch):
+        state_path = os.path.join(temp_directory, "state.json.gz")
+        output_path = os.path.join(temp_directory, "findings.jsonl")
+        scan(stub_registry(GRAPH, MISSING), ROOTS, state_path, output_path, ttl=60)
+        now = time.time()
+        monkeypatch.setattr(incremental.time, "time", lambda: now + 120)
+        analyzer, state = scan(stub_registry(GRAPH, MISSING), ROOTS, state_path, output_path, ttl=60)
+        assert state.reused_roots == 0
+        assert len(analyzer.session.urls) > 0
+
+    def test_roots_with_registry_errors_are_walked_again(self, stub_registry, temp_directory):
+        class Failing(stub_registry):
+            """Registry failing to answer about router"""
+            def get(self, url, **kwargs):
+                response = super().get(url, **kwargs)
+                if "/p/router/" in url:
+                    response.status_code = 500
+                return response
+
+        state_path = os.path.join(temp_directory, "state.json.gz")
+        output_path = os.path.join(temp_directory, "findings.jsonl")
+        first, _ = scan(Failing(GRAPH, MISSING), ROOTS, state_path, output_path)
+        assert first.unchecked == {"router": "1.1.0"}
+        second, state = scan(stub_registry(GRAPH, MISSING), ROOTS, state_path, output_path)
+        # app met the error and is walked again, cli only found router already checked through app
+        assert state.reused_roots == 1
+        assert second.unchecked == {}
+        assert second.takeover == {"gone": "0.1.0", "lost": "1.0.0"}
+
+
+@pytest.mark.unit
+@pytest.mark.npm
+def test_changed_manifests_are_parsed_again(temp_directory):
+    paths = []
+    for name in ["front", "back"]:
+        os.mkdir(os.path.join(temp_directory, name))
+        paths.append(os.path.join(temp_directory, name, "package.json"))
+        with open(paths[-1], "w", encoding="utf-8") as fd:
+            json.dump({"dependencies": {f"{name}-lib": "1.0.0"}}, fd)
+    state_path = os.path.join(temp_directory, "state.json.gz")
+    runs = []
+    for _ in range(2):
+        state = IncrementalState(state_path)
+        recover = RecoverDependencies(temp_directory, "npm", incremental=state, use_lockfiles=False)
+        recover.run()
+        state.save()
+        runs.append((state.reused_manifests, recover.dependencies))
+        with open(paths[1], "w", encoding="utf-8") as fd:
+            json.dump({"dependencies": {"back-lib": "2.0.0"}}, fd)
+    assert runs[0] == (0, {"front-lib": "1.0.0", "back-lib": "1.0.0"})
+    assert runs[1] == (1, {"front-lib": "1.0.0", "back-lib": "2.0.0"})
+
+
+@pytest.mark.unit
+@pytest.mark.npm
+def test_workspaces_added_to_an_unchanged_manifest(temp_directory):
+    with open(os.path.join(temp_directory, "package.json"), "w", encoding="utf-8") as fd:
+        json.dump({"workspaces": {"packages": ["packages/*"]},
+                   "dependencies": {"local-lib": "^1.0.0", "express": "^4.18.2"}}, fd)
+    state_path = os.path.join(temp_directory, "state.json.gz")
+    dependencies = []
+    for _ in range(2):
+        state = IncrementalState(state_path)
+        recover = RecoverDependencies(temp_directory, "npm", incremental=state, use_lockfiles=False)
+        recover.run()
+        state.save()
+        dependencies.append(recover.dependencies)
+        os.makedirs(os.path.join(temp_directory, "packages", "local-lib"), exist_ok=True)
+    assert dependencies[0] == {"local-lib": "^1.0.0", "express": "^4.18.2"}
+    # The manifest is reused from the state but the new workspace is still excluded
+    assert state.reused_manifests == 1
+    assert dependencies[1] == {"express": "^4.18.2"}
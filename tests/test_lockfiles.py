@@ -0,0 +1,262 @@
+"""
+Tests of the lockfile parsers
+"""
+import os
+import json
+import pytest
+from utils.manifests import (parse_package_lock, parse_yarn_lock, parse_pnpm_lock, parse_cargo_lock,
+                             parse_python_lock, parse_go_sum, parse_lockfile)
+
+
+def write(directory, filename, content):
+    """Write a lockfile in the temporary directory and return its path"""
+    path = os.path.join(directory, filename)
+    with open(path, "w", encoding="utf-8") as fd:
+        fd.write(content)
+    return path
+
+
+@pytest.mark.unit
+@pytest.mark.npm
+class TestPackageLock:
+    """Tests of package-lock.json"""
+
+    def test_v1_nested_dependencies_and_aliases(self, temp_directory):
+        path = write(temp_directory, "package-lock.json", json.dumps({
+            "lockfileVersion": 1,
+            "dependencies": {
+                "express": {"version": "4.18.2",
+                            "dependencies": {"debug": {"version": "2.6.9"}}},
+                "lodash-alias": {"version": "npm:lodash@4.17.21"},
+                "local": {"version": "file:../local"},
+                "from-git": {"version": "git+https://github.com/a/b.git#abc"}
+            }
+        }))
+        assert sorted(parse_package_lock(path)) == [("debug", "2.6.9"), ("express", "4.18.2"),
+                                                    ("lodash", "4.17.21")]
+
+    def test_v3_packages(self, temp_directory):
+        path = write(temp_directory, "package-lock.json", json.dumps({
+            "lockfileVersion": 3,
+            "packages": {
+                "": {"name": "project", "version": "1.0.0"},
+                "node_modules/express": {"version": "4.18.2"},
+                "node_modules/express/node_modules/debug": {"version": "2.6.9"},
+                "node_modules/@scope/pkg": {"version": "1.0.0"},
+                "node_modules/alias": {"name": "lodash", "version": "4.17.21"},
+                "node_modules/workspace": {"resolved": "packages/workspace", "link": True},
+                "node_modules/local": {"version": "1.0.0", "resolved": "file:../local"},
+                "packages/workspace": {"version": "1.0.0"}
+            }
+        }))
+        assert sorted(parse_package_lock(path)) == [("@scope/pkg", "1.0.0"), ("debug", "2.6.9"),
+                                                    ("express", "4.18.2"), ("lodash", "4.17.21")]
+
+
+@pytest.mark.unit
+@pytest.mark.npm
+class TestYarnLock:
+    """Tests of yarn.lock"""
+
+    def test_classic(self, temp_directory):
+        path = write(temp_directory, "yarn.lock", """# THIS IS AN AUTOGENERATED FILE. DO NOT EDIT THIS FILE DIRECTLY.
+# yarn lockfile v1
+
+
+"@babel/code-frame@^7.0.0", "@babel/code-frame@^7.10.4":
+  version "7.22.13"
+  resolved "https://registry.yarnpkg.com/@babel/code-frame/-/code-frame-7.22.13.tgz"
+
+lodash@^4.17.21:
+  version "4.17.21"
+
+my-lodash@npm:lodash@^4.0.0:
+  version "4.17.20"
+
+local@file:../local:
+  version "1.0.0"
+""")
+        assert parse_yarn_lock(path) == [("@babel/code-frame", "7.22.13"), ("lodash", "4.17.21"),
+                                         ("lodash", "4.17.20")]
+
+    def test_berry(self, temp_directory):
+        path = write(temp_directory, "yarn.lock", """__metadata:
+  version: 6
+  cacheKey: 8
+
+"debug@npm:^4.3.4":
+  version: 4.3.4
+  resolution: "debug@npm:4.3.4"
+
+"project@workspace:.":
+  version: 0.0.0-use.local
+  resolution: "project@workspace:."
+
+"patched@patch:patched@npm%3A1.0.0#./patch":
+  version: 1.0.0
+""")
+        assert parse_yarn_lock(path) == [("debug", "4.3.4")]
+
+
+@pytest.mark.unit
+@pytest.mark.npm
+class TestPnpmLock:
+    """Tests of pnpm-lock.yaml"""
+
+    def test_version_5(self, temp_directory):
+        path = write(temp_directory, "pnpm-lock.yaml", """lockfileVersion: 5.4
+
+specifiers:
+  express: ^4.18.2
+
+packages:
+
+  /express/4.18.2:
+    resolution: {integrity: sha512-abc}
+    dependencies:
+      debug: 2.6.9
+
+  /@scope/pkg/1.0.0_react@18.2.0:
+    resolution: {integrity: sha512-def}
+""")
+        assert parse_pnpm_lock(path) == [("express", "4.18.2"), ("@scope/pkg", "1.0.0")]
+
+    def test_version_6(self, temp_directory):
+        path = write(temp_directory, "pnpm-lock.yaml", """lockfileVersion: '6.0'
+
+packages:
+
+  /express@4.18.2:
+    resolution: {integrity: sha512-abc}
+
+  /@scope/pkg@1.0.0(react@18.2.0):
+    resolution: {integrity: sha512-def}
+""")
+        assert parse_pnpm_lock(path) == [("express", "4.18.2"), ("@scope/pkg", "1.0.0")]
+
+    def test_version_9(self, temp_directory):
+        path = write(temp_directory, "pnpm-lock.yaml", """lockfileVersion: '9.0'
+
+importers:
+
+  .:
+    dependencies:
+      express:
+        specifier: ^4.18.2
+        version: 4.18.2
+
+packages:
+
+  express@4.18.2:
+    resolution: {integrity: sha512-abc}
+
+  '@scope/pkg@1.0.0':
+    resolution: {integrity: sha512-def}
+
+  local@file:../local:
+    resolution: {directory: ../local, type: directory}
+
+snapshots:
+
+  other@1.0.0: {}
+""")
+        assert parse_pnpm_lock(path) == [("express", "4.18.2"), ("@scope/pkg", "1.0.0")]
+
+
+@pytest.mark.unit
+@pytest.mark.cargo
+def test_cargo_lock_skips_local_crates(temp_directory):
+    path = write(temp_directory, "Cargo.lock", """version = 3
+
+[[package]]
+name = "project"
+version = "0.1.0"
+dependencies = ["serde"]
+
+[[package]]
+name = "serde"
+version = "1.0.190"
+source = "registry+https://github.com/rust-lang/crates.io-index"
+
+[[package]]
+name = "rand"
+version = "0.8.5"
+source = "sparse+https://index.crates.io/"
+
+[[package]]
+name = "forked"
+version = "0.1.0"
+source = "git+https://github.com/a/forked#abc"
+""")
+    assert parse_cargo_lock(path) == [("serde", "1.0.190"), ("rand", "0.8.5")]
+
+
+@pytest.mark.unit
+@pytest.mark.pypi
+class TestPythonLock:
+    """Tests of poetry.lock and uv.lock"""
+
+    def test_poetry(self, temp_directory):
+        path = write(temp_directory, "poetry.lock", """[[package]]
+name = "requests"
+version = "2.31.0"
+description = "Python HTTP for Humans."
+
+[[package]]
+name = "local-lib"
+version = "0.1.0"
+
+[package.source]
+type = "directory"
+url = "../local-lib"
+
+[[package]]
+name = "private"
+version = "1.0.0"
+
+[package.source]
+type = "legacy"
+url = "https://pypi.example.com/simple"
+reference = "private"
+""")
+        assert parse_python_lock(path) == [("requests", "2.31.0"), ("private", "1.0.0")]
+
+    def test_uv(self, temp_directory):
+        path = write(temp_directory, "uv.lock", """version = 1
+requires-python = ">=3.13"
+
+[[package]]
+name = "project"
+version = "0.1.0"
+source = { editable = "." }
+
+[[package]]
+name = "requests"
+version = "2.31.0"
+source = { registry = "https://pypi.org/simple" }
+
+[[package]]
+name = "from-git"
+version = "1.0.0"
+source = { git = "https://github.com/a/b?rev=abc" }
+""")
+        assert parse_python_lock(path) == [("requests", "2.31.0")]
+
+
+@pytest.mark.unit
+@pytest.mark.go
+def test_go_sum_keeps_the_last_version(temp_directory):
+    path = write(temp_directory, "go.sum", """github.com/gin-gonic/gin v1.9.0 h1:abc=
+github.com/gin-gonic/gin v1.9.0/go.mod h1:def=
+github.com/gin-gonic/gin v1.9.1 h1:ghi=
+golang.org/x/crypto v0.14.0/go.mod h1:jkl=
+""")
+    assert parse_go_sum(path) == [("github.com/gin-gonic/gin", "v1.9.1"), ("golang.org/x/crypto", "v0.14.0")]
+
+
+@pytest.mark.unit
+def test_parse_lockfile_dispatches_on_the_filename(temp_directory):
+    directory = os.path.join(temp_directory, "nested")
+    os.mkdir(directory)
+    path = write(directory, "go.sum", "golang.org/x/text v0.13.0 h1:abc=\n")
+    assert parse_lockfile(path) == [("golang.org/x/text", "v0.13.0")]
@@ -0,0 +1,129 @@
+"""
+Tests of the streaming pom.xml parser
+"""
+import os
+import pytest
+from utils.manifests import iter_maven_dependencies, parse_maven_manifest, resolve_pom_version
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_pom(directory, content):
+    """Write a pom.xml in the temporary directory and return its path"""
+    path = os.path.join(directory, "pom.xml")
+    with open(path, "w", encoding="utf-8") as fd:
+        fd.write(content)
+    return path
+
+
+@pytest.mark.unit
+@pytest.mark.maven
+class TestPomParser:
+    """Tests of iter_maven_dependencies"""
+
+    def test_sample_pom(self):
+        assert parse_maven_manifest(os.path.join(HERE, "pom.xml")) == [
+            ("junit:junit", "4.13.2"),
+            ("org.apache.commons:commons-lang3", "3.12.0"),
+            ("com.fake:fake-dependency", "0.0.1")]
+
+    def test_properties_declared_before_and_after_dependencies(self, temp_directory):
+        path = write_pom(temp_directory, """<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+  <groupId>com.example</groupId>
+  <artifactId>app</artifactId>
+  <version>2.0.0</version>
+  <properties>
+    <jackson.version>2.15.2</jackson.version>
+  </properties>
+  <dependencies>
+    <dependency>
+      <groupId>com.fasterxml.jackson.core</groupId>
+      <artifactId>jackson-databind</artifactId>
+      <version>${jackson.version}</version>
+    </dependency>
+    <dependency>
+      <groupId>com.example</groupId>
+      <artifactId>sibling</artifactId>
+      <version>${project.version}</version>
+    </dependency>
+    <dependency>
+      <groupId>org.slf4j</groupId>
+      <artifactId>slf4j-api</artifactId>
+      <version>${slf4j.version}</version>
+    </dependency>
+  </dependencies>
+  <properties>
+    <slf4j.version>2.0.9</slf4j.version>
+  </properties>
+</project>
+""")
+        assert list(iter_maven_dependencies(path)) == [
+            ("com.fasterxml.jackson.core", "jackson-databind", "2.15.2"),
+            ("com.example", "sibling", "2.0.0"),
+            ("org.slf4j", "slf4j-api", "2.0.9")]
+
+    def test_dependency_management(self, temp_directory):
+        path = write_pom(temp_directory, """<project>
+  <parent>
+    <groupId>com.example</groupId>
+    <artifactId>parent</artifactId>
+    <version>1.5.0</version>
+  </parent>
+  <artifactId>child</artifactId>
+  <properties>
+    <guava.version>32.1.2-jre</guava.version>
+  </properties>
+  <dependencies>
+    <dependency>
+      <groupId>com.google.guava</groupId>
+      <artifactId>guava</artifactId>
+    </dependency>
+    <dependency>
+      <groupId>com.example</groupId>
+      <artifactId>core</artifactId>
+      <version>${project.version}</version>
+    </dependency>
+  </dependencies>
+  <dependencyManagement>
+    <dependencies>
+      <dependency>
+        <groupId>com.google.guava</groupId>
+        <artifactId>guava</artifactId>
+        <version>${guava.version}</version>
+      </dependency>
+    </dependencies>
+  </dependencyManagement>
+</project>
+""")
+        dependencies = list(iter_maven_dependencies(path))
+        assert ("com.google.guava", "guava", "32.1.2-jre") in dependencies
+        # The project version is inherited from the parent
+        assert ("com.example", "core", "1.5.0") in dependencies
+
+    def test_unknown_property_is_kept(self, temp_directory):
+        path = write_pom(temp_directory, """<project>
+  <dependencies>
+    <dependency>
+      <groupId>org.example</groupId>
+      <artifactId>lib</artifactId>
+      <version>${missing.version}</version>
+    </dependency>
+    <dependency>
+      <artifactId>no-group</artifactId>
+      <version>1.0.0</version>
+    </dependency>
+  </dependencies>
+</project>
+""")
+        assert list(iter_maven_dependencies(path)) == [("org.example", "lib", "${missing.version}")]
+
+
+@pytest.mark.unit
+@pytest.mark.maven
+def test_resolve_pom_version():
+    properties = {"a": "${b}", "b": "1.2.3", "project.version": "4.0.0"}
+    assert resolve_pom_version("${a}", properties) == "1.2.3"
+    assert resolve_pom_version("${pom.version}", properties) == "4.0.0"
+    assert resolve_pom_version("${unknown}", properties) is None
+    assert resolve_pom_version("${loop}", {"loop": "${loop}"}) is None
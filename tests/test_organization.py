@@ -0,0 +1,45 @@
+"""
+Tests of the organization scan
+"""
+import os
+import json
+import pytest
+from utils.scanner import Scanner
+from utils.incremental import IncrementalState
+from utils.organization import OrganizationScan
+
+GRAPH = {("lib", "1.0.0"): [("gone", "1.0.0"), ("util", "2.0.0")],
+         ("util", "2.0.0"): [("gone", "1.0.0")],
+         ("tool", "3.0.0"): [("util", "2.0.0")]}
+
+
+def write_repository(directory, name, dependencies):
+    """Create a repository holding one package.json, returns its path"""
+    repository = os.path.join(directory, name)
+    os.mkdir(repository)
+    with open(os.path.join(repository, "package.json"), "w", encoding="utf-8") as fd:
+        json.dump({"dependencies": dependencies}, fd)
+    return repository
+
+
+@pytest.mark.unit
+@pytest.mark.npm
+def test_incremental_rerun_keeps_the_attribution(stub_registry, temp_directory):
+    repositories = [write_repository(temp_directory, "front", {"lib": "1.0.0"}),
+                    write_repository(temp_directory, "back", {"tool": "3.0.0"})]
+    state_path = os.path.join(temp_directory, "state.json.gz")
+    findings = []
+    for _ in range(2):
+        state = IncrementalState(state_path)
+        scanner = Scanner(use_lockfiles=False)
+        scanner.client = stub_registry(GRAPH, {"gone"})
+        scan = OrganizationScan(scanner, repositories, ["npm"])
+        scan.run(state)
+        state.save()
+        scanner.close()
+        findings.append(scan.findings())
+    assert state.reused_roots == 2
+    assert findings[0] == findings[1]
+    declared_by = findings[1][0]["declared_by"]
+    assert sorted((os.path.basename(entry["repository"]), entry["path"]) for entry in declared_by) == [
+        ("back", ["tool", "util", "gone"]), ("front", ["lib", "gone"])]
@@ -0,0 +1,45 @@
+"""
+Tests of the resident scanning service
+"""
+import os
+import socket
+import pytest
+from utils.server import parse_job, serve, stale_socket
+
+
+@pytest.mark.unit
+class TestParseJob:
+    """Tests of the validation of job requests"""
+
+    def test_dependencies(self):
+        job, error = parse_job(b'{"provider": "npm", "dependencies": {"left-pad": "1.3.0"}}')
+        assert error is None
+        assert job.dependencies == {"left-pad": "1.3.0"}
+        job, error = parse_job(b'{"provider": "npm", "dependencies": ["left-pad:1.3.0", "lodash"]}')
+        assert job.dependencies == {"left-pad": "1.3.0", "lodash": ""}
+
+    @pytest.mark.parametrize("body", [b'{"dependencies": {"foo": null}}', b'{"dependencies": {"foo": 1}}',
+                                      b'{"dependencies": {"foo": ["1.0.0"]}}'])
+    def test_versions_must_be_strings(self, body):
+        assert parse_job(body) == (None, "dependency versions must be strings")
+
+
+@pytest.mark.unit
+def test_serve_keeps_a_file_at_the_socket_path(temp_directory):
+    path = os.path.join(temp_directory, "notes.txt")
+    with open(path, "w", encoding="utf-8") as fd:
+        fd.write("not a socket")
+    assert not stale_socket(path)
+    with pytest.raises(FileExistsError):
+        serve(None, socket_path=path)
+    with open(path, "r", encoding="utf-8") as fd:
+        assert fd.read() == "not a socket"
+
+
+@pytest.mark.unit
+def test_stale_socket(temp_directory):
+    path = os.path.join(temp_directory, "depfu.sock")
+    assert not stale_socket(path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(path)
+    assert stale_socket(path)
@@ -0,0 +1,16 @@
+"""
+Tests of the offline registry snapshot
+"""
+import pytest
+from utils.snapshot import RegistrySnapshot
+
+
+@pytest.mark.unit
+def test_missing_provider_is_reported_once(temp_directory, capsys):
+    snapshot = RegistrySnapshot(temp_directory)
+    assert [snapshot.exists("npm", name) for name in ["left-pad", "lodash", "express"]] == [None] * 3
+    assert snapshot.exists("pypi", "requests") is None
+    assert capsys.readouterr().out.splitlines() == [
+        f"[-] Could not check npm packages: no npm snapshot in {temp_directory}",
+        f"[-] Could not check pypi packages: no pypi snapshot in {temp_directory}"]
+    snapshot.close()
@@ -0,0 +1,41 @@
+"""
+Tests of the dependency traversal against a stubbed registry
+"""
+import random
+import pytest
+from utils.analyze_dependencies import AnalyzeDependencies
+
+
+def synthetic_graph(nodes, fanout, missing_ratio, seed):
+    """Build a random graph where every package is reachable from pkg0, returns (graph, missing)"""
+    rng = random.Random(seed)
+    names = [f"pkg{i}" for i in range(nodes)]
+    graph = {}
+    for i, name in enumerate(names):
+        children = [names[i + 1]] if i < nodes - 1 else []
+        children += [names[rng.randrange(nodes)] for _ in range(fanout - 1)]
+        graph[(name, "1.0.0")] = [(child, "1.0.0") for child in dict.fromkeys(children) if child != name]
+    return graph, set(rng.sample(names[1:], int(nodes * missing_ratio)))
+
+
+def walk(stub, graph, missing, concurrency):
+    """Walk the graph from pkg0, returns the analyzer and the requests it sent"""
+    session = stub(graph, missing)
+    analyzer = AnalyzeDependencies("npm", {"pkg0": "1.0.0"}, False, None, False, concurrency=concurrency,
+                                   session=session)
+    analyzer.analyze()
+    return analyzer, session.urls
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("seed", [1, 2, 3])
+@pytest.mark.parametrize("concurrency", [4, 32])
+def test_concurrent_walk_matches_the_serial_walk(stub_registry, seed, concurrency):
+    graph, missing = synthetic_graph(300, 4, 0.05, seed)
+    serial, serial_urls = walk(stub_registry, graph, missing, 1)
+    concurrent, concurrent_urls = walk(stub_registry, graph, missing, concurrency)
+    assert len(serial.takeover) > 0
+    assert concurrent.takeover == serial.takeover
+    assert dict(concurrent.already_done) == dict(serial.already_done)
+    # Speculative prefetch may ask more, but never skips a request of the serial walk
+    assert set(serial_urls) <= set(concurrent_urls)
@@ -2,9 +2,68 @@
 File used to declare the analyzer for dependencies
 """
 
-import requests
-from utils.misc import dependency_exists, recover_dependencies
-from utils.email_checker import EmailChecker
+import asyncio
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from utils.http_client import HttpClient, DEFAULT_RATE
+from utils.providers import get_provider
+from utils.cache import RegistryCache
+from utils.metrics import METRICS
+from utils.misc import log
+from utils.graph import DependencyGraph, VisitedView, ParentsView
+
+GRAPH_MODES = ["recursive", "resolved"]
+
+
+class Frontier:
+    """
+    Class used to hold the packages waiting to be checked, as a stack of
+    (package, version, expand) entries stored as ids of the graph, with a flag per package for O(1) membership
+    """
+
+    __slots__ = ("graph", "packages", "versions", "expand", "queued")
+
+    def __init__(self, graph=None):
+        self.graph = graph if graph is not None else DependencyGraph()
+        self.packages = array("i")
+        self.versions = array("i")
+        self.expand = bytearray()
+        self.queued = bytearray()
+
+    def push(self, package, version, expand):
+        """
+        Method used to add a package on top of the frontier
+        """
+        index = self.graph.node(package)
+        self.packages.append(index)
+        self.versions.append(self.graph.versions.intern(version))
+        self.expand.append(expand)
+        if index >= len(self.queued):
+            self.queued.extend(bytes(len(self.graph.names) - len(self.queued)))
+        self.queued[index] = 1
+
+    def pop(self):
+        """
+        Method used to remove the package on top of the frontier
+        """
+        index = self.packages.pop()
+        self.queued[index] = 0
+        return self.graph.names[index], self.graph.versions[self.versions.pop()], bool(self.expand.pop())
+
+    @property
+    def stack(self):
+        """
+        Method used to recover the waiting (package, version, expand) tuples, bottom first
+        """
+        return [(self.graph.names[index], self.graph.versions[version], bool(expand))
+                for index, version, expand in zip(self.packages, self.versions, self.expand)]
+
+    def __contains__(self, package):
+        index = self.graph.names.find(package)
+        return index is not None and index < len(self.queued) and self.queued[index] == 1
+
+    def __len__(self):
+        return len(self.packages)
 
 
 class AnalyzeDependencies:
@@ -12,99 +71,503 @@ class AnalyzeDependencies:
     Class used to analyze and recover all dependencies of environment
     """
 
-    def __init__(self, provider, dependencies, print_takeover, output, check_email):
+    def __init__(self, provider, dependencies, print_takeover, output, check_email, concurrency=1,
+                 cache=None, rate=DEFAULT_RATE, graph_mode="recursive", stream=None, checkpoint=None,
+                 session=None, incremental=None, snapshot=None, known=None, locked=None):
         self.packages_json = []
         self.dependencies = dependencies
-        self.already_done = {}
+        # Visited packages, their parents and dependencies are kept in a compact graph
+        self.graph = DependencyGraph()
+        self.already_done = VisitedView(self.graph)
         self.provider = provider
+        self.plugin = get_provider(provider)
         self.takeover = {}
+        self.unchecked = {}
         self.print_takeover = print_takeover
         self.output = output
+        self.stream = stream
+        self.parents = ParentsView(self.graph)
         self.check = check_email
         self.email_takeover = []
-        self.session = requests.Session()
+        self.concurrency = max(1, concurrency)
+        # In resolved mode only roots are expanded, their graph already holds every transitive node
+        self.graph_mode = graph_mode
+        self.expand_children = graph_mode == "recursive"
+        self.session = session if session is not None else HttpClient(rate=rate, pool_size=self.concurrency)
+        if isinstance(self.session, HttpClient):
+            for host, host_concurrency in self.plugin.host_concurrency.items():
+                self.session.limit_host(host, host_concurrency)
+        self.cache = cache if cache is not None else RegistryCache()
+        self.domains = None
+        if check_email:
+            # whois and the email checker are only loaded by scans checking emails
+            from utils.email_checker import DomainChecker
+            self.domains = DomainChecker(self.cache)
+        # When emails are checked the registry document also answers the existence check
+        self.use_metadata = check_email and self.plugin.metadata_url is not None
+        self.frontier = Frontier(self.graph)
+        self.semaphore = None
+        self.executor = None
+        self.pending = {}
+        # Names whose fetch was started by the current walk, speculative fetches skip them
+        self.fetched = set()
+        self.checkpoint = checkpoint
+        self.incremental = incremental
+        self.snapshot = snapshot
+        self.known = known
+        # Roots resolved by a lockfile, the lockfile already listed their dependencies
+        self.locked = locked if locked is not None else set()
+        # Results of a root only hold for the mode and the sources they were resolved with
+        source = "snapshot" if snapshot is not None else "known" if known is not None else "registry"
+        self.incremental_key = f"{provider}:{graph_mode}:{'email' if check_email else 'noemail'}:{source}"
+        self.journal = None
+        if checkpoint is not None and checkpoint.provider_state(provider) is not None:
+            self.restore(checkpoint.provider_state(provider))
 
-    def check_dependency(self, root_package, root_version):
+    def get_subdependencies(self, package, version):
         """
-        Method used to check if a dependency exists
+        Method used to recover the direct dependencies of a package as (name, version) tuples
+        """
+        if self.snapshot is not None:
+            return self.snapshot.dependencies(self.provider, package, version)
+        return self.plugin.resolve_graph(package, version, self.session, self.cache) or []
+
+    async def run_blocking(self, function, *args):
+        """
+        Method used to run a blocking call in a worker thread, inline when only one request may be in flight.
+        The walk has its own pool, the default one of the loop is smaller than large --concurrency values.
+        """
+        if self.executor is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def package_exists(self, package):
+        """
+        Method used to check if a package exists, from the registry metadata when it is needed anyway.
+        Packages found in the known packages filter are not checked.
+        """
+        if self.snapshot is not None:
+            return self.snapshot.exists(self.provider, package)
+        if self.known is not None and self.known.skip(self.provider, package):
+            return True
+        if self.use_metadata:
+            metadata = self.plugin.metadata(package, self.session, self.cache)
+            return None if metadata is None else metadata["exists"]
+        return self.plugin.exists(package, self.session, self.cache)
+
+    def prefetch_existence(self, packages):
+        """
+        Method used to check packages in batches ahead of the walk when the provider has a bulk endpoint,
+        answers land in the cache
+        """
+        if not self.plugin.supports_batch_exists or self.snapshot is not None:
+            return
+        packages = [package for package in packages
+                    if package is not None and package not in self.already_done
+                    and (self.known is None or not self.known.contains(self.provider, package))]
+        if len(packages) > 1:
+            self.plugin.batch_exists(packages, self.session, self.cache)
+
+    async def fetch_package(self, package, version, expand):
+        """
+        Method used to check a package and recover its dependencies without blocking the event loop
+        """
+        async with self.semaphore:
+            exists = await self.run_blocking(self.package_exists, package)
+            if not exists:
+                return exists, [], []
+            # Email lookups of different packages overlap, they are reported in walk order
+            emails = await self.run_blocking(self.get_email_takeover, package) if self.check else []
+            if not expand:
+                return exists, [], emails
+            subdependencies = await self.run_blocking(self.get_subdependencies, package, version)
+            if self.plugin.supports_batch_exists and self.snapshot is None:
+                await self.run_blocking(self.prefetch_existence, [name for name, _ in subdependencies])
+        if self.concurrency > 1:
+            # Expand breadth-first ahead of the walk, results are consumed in serial order
+            for subpackage, subpackage_version in subdependencies:
+                self.schedule(subpackage, subpackage_version, self.expand_children, speculative=True)
+        return exists, subdependencies, emails
+
+    def schedule(self, package, version, expand=True, speculative=False):
+        """
+        Method used to start fetching a package if it is not already in flight.
+        Speculative fetches are skipped for names the walk already fetched, checked or queued, whatever the version.
+        """
+        key = (package, version, expand)
+        if package is None or key in self.pending:
+            return
+        if speculative and (package in self.fetched or package in self.already_done or package in self.frontier):
+            return
+        self.fetched.add(package)
+        self.pending[key] = asyncio.create_task(self.fetch_package(package, version, expand))
+
+    async def resolve(self, package, version, expand=True):
+        """
+        Method used to wait for the result of a package fetch
         """
-        stack = []
-        stack.append({root_package: root_version})
-        while len(stack) != 0:
-            package, version = list(stack.pop().items())[0]
-            if package is not None and dependency_exists(package, self.provider, self.session):
+        if package is None:
+            return None, [], []
+        self.schedule(package, version, expand)
+        return await self.pending.pop((package, version, expand))
+
+    async def walk_dependency(self, root_package, root_version, expand=True):
+        """
+        Method used to walk the dependency graph of a root package in the same order as a serial walk
+        """
+        self.graph.add_root(root_package)
+        self.frontier = Frontier(self.graph)
+        self.frontier.push(root_package, root_version, expand)
+        self.schedule(root_package, root_version, expand)
+        await self.walk_frontier(self.frontier)
+
+    async def walk_frontier(self, frontier):
+        """
+        Method used to check packages until the frontier is empty
+        """
+        while len(frontier) != 0:
+            METRICS.sample("frontier_size", len(frontier), provider=self.provider)
+            package, version, expand = frontier.pop()
+            exists, subdependencies, emails = await self.resolve(package, version, expand)
+            self.note("visited", package, version)
+            METRICS.inc("packages_total", provider=self.provider,
+                        result="unchecked" if exists is None else "found" if exists else "missing")
+            if package is not None and exists is None:
+                self.already_done[package] = version
+                self.unchecked[package] = version
+                self.note("unchecked", package, version)
+            elif package is not None and exists:
                 if self.check:
-                    self.check_email(package)
-                deps = recover_dependencies(package, version, self.provider, self.session)
+                    self.report_email(package, emails, version)
                 self.already_done[package] = version
-                if deps is not None and deps.status_code == 200:
-                    deps = deps.json()
-                    if deps.get("dependencyCount") and deps["dependencyCount"] > 0:
-                        for dep in deps["dependencies"][1:]:
-                            subpackage = dep["package"]["name"]
-                            subpackage_version = dep["version"]
-                            if (
-                                subpackage not in self.already_done
-                                and subpackage not in [list(x.keys())[0] for x in stack]
-                            ):
-                                stack.append({subpackage: subpackage_version})
+                if len(subdependencies) > 0:
+                    self.graph.add_edges(package, subdependencies)
+                    self.note("edges", package, subdependencies)
+                self.push_dependencies(frontier, package, subdependencies)
             else:
                 self.already_done[package] = version
-                if package not in self.takeover:
-                    self.takeover[package] = version
-                if self.print_takeover:
-                    if package is not None:
-                        if "@" in package:
-                            print(
-                                f"""[DEBUG] {package} is not declared but cannot be taken over because it belongs to an external organization\nYou might have to check manually if the organization exists."""
-                            )
-                        else:
-                            print(f"[DEBUG] {package}:{version} might be taken over !")
+                self.report_takeover(package, version)
+            if self.checkpoint is not None and self.checkpoint.due():
+                self.save_checkpoint()
+
+    def push_dependencies(self, frontier, package, subdependencies):
+        """
+        Method used to queue the dependencies of a package which were neither checked nor queued yet
+        """
+        for subpackage, subpackage_version in subdependencies:
+            if subpackage in self.already_done:
+                self.note("skipped", subpackage)
+            elif subpackage not in frontier:
+                frontier.push(subpackage, subpackage_version, self.expand_children)
+                self.parents[subpackage] = package
+                self.note("parents", subpackage, package)
+                self.schedule(subpackage, subpackage_version, self.expand_children)
+
+    async def walk_versions(self, roots):
+        """
+        Method used to walk the dependencies of other versions of packages which were already checked.
+        Existence doesn't depend on the version, only the dependency graph of every version is fetched.
+        """
+        self.start_walk()
+        try:
+            for package, version in roots:
+                if (package not in self.already_done or package in self.takeover
+                    or package in self.unchecked):
+                    continue
+                subdependencies = await self.run_blocking(self.get_subdependencies, package, version)
+                if len(subdependencies) > 0:
+                    self.graph.merge_edges(package, subdependencies)
+                self.frontier = Frontier(self.graph)
+                self.push_dependencies(self.frontier, package, subdependencies)
+                await self.walk_frontier(self.frontier)
+        finally:
+            self.stop_walk()
+
+    def expand_versions(self, roots):
+        """
+        Method used to walk other declared versions of checked packages, as (name, version) pairs
+        """
+        with METRICS.timer("phase_seconds", phase="resolve", provider=self.provider):
+            asyncio.run(self.walk_versions(roots))
+
+    def report_takeover(self, package, version):
+        """
+        Method used to record a package which might be taken over
+        """
+        if package not in self.takeover:
+            self.takeover[package] = version
+            self.note("takeover", package, version)
+            if package is not None:
+                reason = "organization_not_found" if "@" in package else "not_found"
+                self.record_finding(package, version, reason)
+        if self.print_takeover:
+            if package is not None:
+                if "@" in package:
+                    log(
+                        f"""[DEBUG] {package} is not declared but cannot be taken over because it belongs to an external organization\nYou might have to check manually if the organization exists."""
+                    )
+                else:
+                    log(f"[DEBUG] {package}:{version} might be taken over !")
+
+    def note(self, kind, *entry):
+        """
+        Method used to journal what the walk of the current root changed, for incremental scans
+        """
+        if self.journal is not None:
+            self.journal[kind].append(entry)
+
+    def reuse_root(self, root_package, root_version):
+        """
+        Method used to replay what a previous run found for a root instead of walking it again.
+        Packages the root reached through other roots must still be covered, else it is walked.
+        """
+        result = self.incremental.root_result(self.incremental_key, root_package, root_version)
+        if result is None:
+            return False
+        visited = {package for package, _ in result["visited"]}
+        if any(package not in self.already_done and package not in visited
+               for package, in result["skipped"]):
+            return False
+        # Only links between packages this root reaches first can be replayed, a link towards a package
+        # another root already reached could close a cycle of parents
+        fresh = {package for package in visited if package not in self.already_done} | {root_package}
+        parents = [(package, parent) for package, parent in result["parents"] if package in fresh]
+        if any(parent not in fresh for _, parent in parents):
+            return False
+        for package, parent in parents:
+            self.parents.setdefault(package, parent)
+        for package, subdependencies in result["edges"]:
+            if package in fresh:
+                self.graph.add_edges(package, subdependencies)
+        for package, version in result["visited"]:
+            self.already_done.setdefault(package, version)
+        for package, version in result["takeover"]:
+            self.report_takeover(package, version)
+        for package, version, domain, email in result["emails"]:
+            self.report_email(package, [(domain, email)], version)
+        self.incremental.store_root(self.incremental_key, root_package, root_version, result, reused=True)
+        return True
+
+    def start_walk(self):
+        """
+        Method used to reset the fetch state before entering the event loop
+        """
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.pending = {}
+        self.fetched = set()
+        if self.concurrency > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="fetch")
+
+    def stop_walk(self):
+        """
+        Method used to cancel fetches that were started ahead of the walk but never consumed
+        """
+        for task in self.pending.values():
+            task.cancel()
+        self.pending = {}
+        self.fetched = set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def walk_dependencies(self, roots):
+        """
+        Method used to walk several roots with at most `concurrency` requests in flight
+        """
+        self.start_walk()
+        try:
+            if len(self.frontier) != 0:
+                # Finish the root which was being walked when the checkpoint was written
+                for package, version, expand in self.frontier.stack:
+                    self.schedule(package, version, expand)
+                await self.walk_frontier(self.frontier)
+            await self.run_blocking(self.prefetch_existence,
+                                    [key for key, val in roots if not self.has_root_result(key, val)])
+            if self.concurrency > 1:
+                for key, val in roots:
+                    if key not in self.already_done and not self.has_root_result(key, val):
+                        self.schedule(key, val, key not in self.locked)
+            for key, val in roots:
+                if key in self.already_done:
+                    self.graph.add_root(key)
+                    continue
+                if self.incremental is not None and self.reuse_root(key, val):
+                    self.graph.add_root(key)
+                    continue
+                self.already_done[key] = val
+                expand = key not in self.locked
+                if self.incremental is not None and expand:
+                    self.journal = {"visited": [], "takeover": [], "unchecked": [],
+                                    "parents": [], "edges": [], "emails": [], "skipped": []}
+                await self.walk_dependency(key, val, expand)
+                if self.journal is not None:
+                    # Roots with registry errors are walked again by the next run
+                    if len(self.journal["unchecked"]) == 0:
+                        self.journal.pop("unchecked")
+                        self.incremental.store_root(self.incremental_key, key, val, self.journal)
+                    self.journal = None
+        finally:
+            self.stop_walk()
+
+    def has_root_result(self, root_package, root_version):
+        """
+        Method used to know if a previous run resolved a root
+        """
+        if self.incremental is None:
+            return False
+        return self.incremental.root_result(self.incremental_key, root_package, root_version) is not None
+
+    async def walk_root(self, root_package, root_version):
+        """
+        Method used to walk a single root
+        """
+        self.start_walk()
+        try:
+            await self.walk_dependency(root_package, root_version)
+        finally:
+            self.stop_walk()
+
+    def check_dependency(self, root_package, root_version):
+        """
+        Method used to check if a dependency exists
+        """
+        with METRICS.timer("phase_seconds", phase="resolve", provider=self.provider):
+            asyncio.run(self.walk_root(root_package, root_version))
 
     def analyze_dependencies(self):
         """
         Method used to iterate over all dependencies
         """
-        for key, val in self.dependencies.items():
-            if key in self.already_done:
-                continue
-            self.already_done[key] = val
-            self.check_dependency(key, val)
+        with METRICS.timer("phase_seconds", phase="resolve", provider=self.provider):
+            asyncio.run(self.walk_dependencies(list(self.dependencies.items())))
+        if self.checkpoint is not None:
+            self.save_checkpoint(done=True)
 
-    def check_email(self, package):
+    def save_checkpoint(self, done=False):
         """
-        Method used to check if an email exists
+        Method used to save the traversal state, only between two packages so that it stays consistent
+        """
+        self.checkpoint.update(self.provider, {
+            "done": done,
+            "graph": self.graph.to_dict(),
+            "takeover": list(self.takeover.items()),
+            "unchecked": list(self.unchecked.items()),
+            "email_takeover": self.email_takeover,
+            "frontier": self.frontier.stack,
+        }, force=done)
+
+    def restore(self, state):
+        """
+        Method used to restore the traversal state saved by a previous run
+        """
+        # Visited packages, parents, edges and roots all live in the graph, paths survive the resume
+        self.graph = DependencyGraph.from_dict(state["graph"])
+        self.already_done = VisitedView(self.graph)
+        self.parents = ParentsView(self.graph)
+        self.takeover = dict(state["takeover"])
+        self.unchecked = dict(state["unchecked"])
+        self.email_takeover = state["email_takeover"]
+        self.frontier = Frontier(self.graph)
+        for package, version, expand in state["frontier"]:
+            self.frontier.push(package, version, expand)
+        log(f"[+] Resuming {self.provider} analysis: {len(self.already_done)} packages already checked, "
+              f"{len(self.frontier)} waiting.")
+
+    def parent_chain(self, package):
+        """
+        Method used to recover the packages which led to a package, from its root
+        """
+        chain = []
+        parent = self.parents.get(package)
+        while parent is not None:
+            chain.append(parent)
+            parent = self.parents.get(parent)
+        return chain[::-1]
+
+    def record_finding(self, package, version, reason, **details):
+        """
+        Method used to stream a finding to the output file as soon as it is confirmed
+        """
+        if self.stream is None:
+            return
+        record = {"provider": self.provider,
+                  "package": package,
+                  "version": version,
+                  "reason": reason,
+                  "parents": self.parent_chain(package)}
+        record.update(details)
+        self.stream.write(record)
+
+    def get_email_takeover(self, package):
+        """
+        Method used to recover the maintainer domains of a package which might be purchased
+        """
+        from utils.email_checker import EmailChecker
+        ec = EmailChecker(self.provider, package, self.session, self.domains, self.cache)
+        return ec.check_email()
+
+    def report_email(self, package, res, version=""):
+        """
+        Method used to display maintainer domains which might be purchased
         """
-        ec = EmailChecker(self.provider, package)
-        res = ec.check_email()
         if len(res) > 0:
             for r in res:
                 if r[0] not in self.email_takeover:
                     self.email_takeover.append(r[0])
-                    print(
+                    self.note("emails", package, version, r[0], r[1])
+                    self.record_finding(package, version, "email_domain",
+                                        domain=r[0], email=r[1])
+                    log(
                         f"""The account associated to dependency {package} is : {r[1]} and the domain {r[0]} might be purchased !"""
                     )
 
-    def run(self):
+    def check_email(self, package):
         """
-        Main method to run analysis
+        Method used to check if an email exists
         """
-        print(f"[+] Starting analysis for {self.provider}...")
+        self.report_email(package, self.get_email_takeover(package))
+
+    def analyze(self, versions=()):
+        """
+        Method used to run the analysis without displaying its results.
+        Other declared versions of the dependencies, as (name, version) pairs, are walked afterwards.
+        """
+        log(f"[+] Starting analysis for {self.provider}...")
         self.analyze_dependencies()
+        if len(versions) > 0:
+            self.expand_versions(versions)
+        if self.domains is not None:
+            self.domains.close()
+
+    def report(self):
+        """
+        Method used to display or save the results of the analysis
+        """
         if len(self.takeover) > 0:
-            if self.output is not None:
-                with open(self.output, "w", encoding="utf-8") as fd:
+            if self.stream is not None:
+                log(f"Results streamed to {self.stream.path} !")
+            elif self.output is not None:
+                with open(self.output, "a", encoding="utf-8") as fd:
                     for package, version in self.takeover.items():
                         fd.write(f"{package}:{version}\n")
-                print(f"Results saved to {self.output} !")
+                log(f"Results saved to {self.output} !")
             else:
                 for package, version in self.takeover.items():
                     if package is not None:
                         if "@" in package:
-                            print(
+                            log(
                                 f"""[+] {package} is not declared but cannot be taken over because it belongs to an external organization\nYou might have to check manually if the organization exists."""
                             )
                         else:
-                            print(f"[+] {package}:{version} might be taken over !")
+                            log(f"[+] {package}:{version} might be taken over !")
         else:
-            print("[+] No package can be taken over !")
+            log(f"[+] No {self.provider} package can be taken over !")
+        if len(self.unchecked) > 0:
+            log(f"[-] {len(self.unchecked)} {self.provider} packages could not be checked because of registry errors.")
+
+    def run(self):
+        """
+        Main method to run analysis
+        """
+        self.analyze()
+        self.report()
@@ -0,0 +1,156 @@
+"""
+File used to declare the Bloom filters of package names known to be published
+"""
+
+import os
+import math
+import struct
+import hashlib
+import threading
+from utils.cache import RegistryCache
+from utils.snapshot import RegistrySnapshot
+
+BLOOM_MAGIC = b"DEPFUBF1"
+HEADER = struct.Struct("<8sQIQ")
+DEFAULT_FALSE_POSITIVE_RATE = 1e-6
+
+
+class BloomFilter:
+    """
+    Class used to hold a set of names in a fixed number of bits. A name which was added is always
+    found, a name which was not added is found with a probability close to the false positive rate.
+    """
+
+    def __init__(self, size, hashes, bits=None, count=0):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        """
+        Method used to create a filter sized for a number of names and a false positive rate
+        """
+        capacity = max(1, capacity)
+        size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        hashes = max(1, round(size / capacity * math.log(2)))
+        return cls(size, hashes)
+
+    def positions(self, name):
+        """
+        Method used to compute the bits of a name with double hashing
+        """
+        digest = hashlib.blake2b(name.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, name):
+        """
+        Method used to add a name to the filter
+        """
+        for position in self.positions(name):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, name):
+        for position in self.positions(name):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def save(self, path):
+        """
+        Method used to atomically write the filter to a file
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as fd:
+            fd.write(HEADER.pack(BLOOM_MAGIC, self.size, self.hashes, self.count))
+            fd.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Method used to read a filter written by save
+        """
+        with open(path, "rb") as fd:
+            magic, size, hashes, count = HEADER.unpack(fd.read(HEADER.size))
+            if magic != BLOOM_MAGIC:
+                raise ValueError(f"{path} is not a known packages filter")
+            bits = bytearray(fd.read())
+        return cls(size, hashes, bits, count)
+
+
+class KnownPackages:
+    """
+    Class used to skip existence checks of names found in the filter of their provider.
+    Providers without a filter in the folder are always checked.
+    """
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            raise ValueError(f"{directory} is not a known packages folder")
+        self.directory = directory
+        self.filters = {}
+        self.hits = 0
+        self.lock = threading.Lock()
+
+    def bloom_filter(self, provider):
+        """
+        Method used to load the filter of a provider the first time it is needed
+        """
+        with self.lock:
+            if provider not in self.filters:
+                path = os.path.join(self.directory, f"{provider}.bloom")
+                self.filters[provider] = BloomFilter.load(path) if os.path.exists(path) else None
+            return self.filters[provider]
+
+    def contains(self, provider, name):
+        """
+        Method used to know if a package is known to be published
+        """
+        bloom_filter = self.bloom_filter(provider)
+        return bloom_filter is not None and name in bloom_filter
+
+    def skip(self, provider, name):
+        """
+        Method used to know if the existence check of a package can be skipped, hits are counted
+        """
+        if not self.contains(provider, name):
+            return False
+        with self.lock:
+            self.hits += 1
+        return True
+
+
+def build_known_packages(directory, provider, names_file=None, cache_dir=None, snapshot_dir=None,
+                         false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+    """
+    Method used to build the filter of a provider from a names list, the packages a registry
+    cache saw published and the names of a registry snapshot. Returns the number of names added.
+    """
+    names = set()
+    if names_file is not None:
+        with open(names_file, "r", encoding="utf-8") as fd:
+            for line in fd:
+                if line.strip():
+                    names.add(line.strip())
+    if cache_dir is not None:
+        cache = RegistryCache(cache_dir)
+        names.update(cache.published(provider))
+        cache.close()
+    if snapshot_dir is not None:
+        snapshot = RegistrySnapshot(snapshot_dir)
+        table = snapshot.table(provider, "names")
+        if table is not None:
+            names.update(key.decode("utf-8") for key in table.keys())
+        snapshot.close()
+
+    bloom_filter = BloomFilter.for_capacity(len(names), false_positive_rate)
+    for name in names:
+        bloom_filter.add(name)
+    os.makedirs(directory, exist_ok=True)
+    bloom_filter.save(os.path.join(directory, f"{provider}.bloom"))
+    return len(names)
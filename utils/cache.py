@@ -0,0 +1,145 @@
+"""
+File used to declare the persistent cache shared by registry lookups
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from utils.providers import get_provider
+from utils.metrics import METRICS
+
+DEFAULT_TTL = 86400
+DEFAULT_MAX_ENTRIES = 1000000
+CACHE_FILENAME = "registry.sqlite3"
+
+
+class RegistryCache:
+    """
+    Class used to store registry answers on disk so they can be reused between runs
+    """
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.writes = 0
+        self.lock = threading.Lock()
+        if cache_dir is None:
+            path = ":memory:"
+        else:
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, CACHE_FILENAME)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        if cache_dir is not None:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                provider TEXT NOT NULL,
+                name TEXT NOT NULL,
+                version TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (provider, name, version, endpoint)
+            )"""
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
+        self.connection.commit()
+
+    def get(self, provider, name, version, endpoint):
+        """
+        Method used to recover a cached value, returns a (found, value) tuple
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value, created FROM entries WHERE provider=? AND name=? AND version=? AND endpoint=?",
+                (provider, name, version, endpoint),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                METRICS.inc("cache_lookups_total", provider=provider, endpoint=endpoint, result="miss")
+                return False, None
+            if self.ttl > 0 and time.time() - row[1] > self.ttl:
+                self.expired += 1
+                self.misses += 1
+                METRICS.inc("cache_lookups_total", provider=provider, endpoint=endpoint, result="expired")
+                return False, None
+            self.hits += 1
+            METRICS.inc("cache_lookups_total", provider=provider, endpoint=endpoint, result="hit")
+        return True, json.loads(row[0])
+
+    def set(self, provider, name, version, endpoint, value):
+        """
+        Method used to store a value, the oldest entries are evicted once the cache is full
+        """
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (provider, name, version, endpoint, json.dumps(value), time.time()),
+            )
+            self.connection.commit()
+            self.writes += 1
+            if self.writes % 1000 == 0:
+                self.evict()
+
+    def entries(self, provider, endpoint):
+        """
+        Method used to recover every (name, version, value) cached for an endpoint, expired ones included
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT name, version, value FROM entries WHERE provider=? AND endpoint=?",
+                (provider, endpoint),
+            ).fetchall()
+        return [(name, version, json.loads(value)) for name, version, value in rows]
+
+    def published(self, provider):
+        """
+        Method used to recover the names of every package the registry answered as existing
+        """
+        names = set()
+        for source, endpoint in get_provider(provider).existence_sources():
+            for name, _, value in self.entries(source, endpoint):
+                if value is True or (isinstance(value, dict) and value.get("exists")):
+                    names.add(name)
+        return names
+
+    def evict(self):
+        """
+        Method used to drop the oldest entries above max_entries, the lock must be held
+        """
+        count = self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        extra = count - self.max_entries
+        self.connection.execute(
+            "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY created LIMIT ?)",
+            (extra,),
+        )
+        self.connection.commit()
+        self.evicted += extra
+
+    def stats(self):
+        """
+        Method used to recover hit and miss counters
+        """
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "writes": self.writes}
+
+    def close(self):
+        """
+        Method used to flush and close the underlying database
+        """
+        with self.lock:
+            self.evict()
+            self.connection.close()
@@ -0,0 +1,67 @@
+"""
+File used to declare the checkpoint file used to resume long scans
+"""
+
+import os
+import gzip
+import json
+import time
+import threading
+
+CHECKPOINT_VERSION = 2
+DEFAULT_INTERVAL = 60
+
+
+class Checkpoint:
+    """
+    Class used to periodically save the traversal state of every provider in one gzipped JSON file
+    """
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL, state=None):
+        self.path = path
+        self.interval = interval
+        self.state = state if state is not None else {"version": CHECKPOINT_VERSION, "providers": {}}
+        self.last_save = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, interval=DEFAULT_INTERVAL):
+        """
+        Method used to read a checkpoint written by a previous run
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as fd:
+            state = json.load(fd)
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"{path} is not a checkpoint this version can resume")
+        return cls(path, interval, state)
+
+    def provider_state(self, provider):
+        """
+        Method used to recover the saved state of a provider, None if it was not started
+        """
+        return self.state["providers"].get(provider)
+
+    def update(self, provider, state, force=False):
+        """
+        Method used to record the state of a provider, written to disk once the interval elapsed
+        """
+        with self.lock:
+            self.state["providers"][provider] = state
+            if force or time.monotonic() - self.last_save >= self.interval:
+                self.save()
+
+    def due(self):
+        """
+        Method used to know if the next update will be written to disk
+        """
+        return time.monotonic() - self.last_save >= self.interval
+
+    def save(self):
+        """
+        Method used to atomically write the checkpoint, the lock must be held
+        """
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=3) as fd:
+            json.dump(self.state, fd, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self.last_save = time.monotonic()
@@ -0,0 +1,63 @@
+"""
+File used to declare the manifest discovery shared by every provider
+"""
+
+import os
+from utils.providers import PROVIDER_REGISTRY, provider_names
+from utils.metrics import METRICS
+
+PRUNED_DIRECTORIES = ("node_modules", ".git", "target", "vendor")
+
+
+def classify_manifest(filename):
+    """
+    Method used to recover the provider of a manifest from its filename
+    """
+    for provider in PROVIDER_REGISTRY.values():
+        if provider.matches(filename):
+            return provider.name
+    return None
+
+
+def discover_manifests(path, pruned=PRUNED_DIRECTORIES):
+    """
+    Method used to walk a folder once and sort every manifest by provider.
+    Folders are visited in pre-order like a recursive glob, hidden and pruned folders are skipped.
+    """
+    manifests = {provider: [] for provider in provider_names()}
+    if path is None:
+        return manifests
+    with METRICS.timer("phase_seconds", phase="discovery"):
+        walk_manifests(path, set(pruned), manifests)
+    for provider, found in manifests.items():
+        METRICS.inc("manifests_total", len(found), provider=provider)
+    return manifests
+
+
+def walk_manifests(path, pruned, manifests):
+    """
+    Method used to add every manifest found below a folder to the lists of their provider
+    """
+    stack = [path.rstrip("/") or "/"]
+    while len(stack) != 0:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirectories = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in pruned:
+                        subdirectories.append(entry.path)
+                    continue
+            except OSError:
+                continue
+            provider = classify_manifest(entry.name)
+            if provider is not None:
+                manifests[provider].append(entry.path)
+        stack.extend(reversed(subdirectories))
@@ -4,80 +4,141 @@ File used to declare the class used to check if an email exists
 
 import re
 import socket
-import whois
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.providers import get_provider
+from utils.metrics import METRICS
+
+KNOWN_DOMAINS = ["gmail.com","outlook.com","hotmail.com","protonmail.com"]
+
+
+class DomainChecker:
+    """
+    Class used to resolve maintainer domains in a worker pool.
+    Each domain is looked up once per run, verdicts are also kept in the registry cache.
+    """
+
+    def __init__(self, cache=None, workers=8):
+        self.cache = cache
+        self.verdicts = {}
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="domain")
+
+    def lookup(self, domain):
+        """
+        Method used to recover the verdict of a domain: "resolves", "registered" or "available".
+        A WHOIS failure is answered "available" for this run only, it is not kept in the cache.
+        """
+        if self.cache is not None:
+            found, verdict = self.cache.get("domain", domain, "", "verdict")
+            if found:
+                return verdict
+        try:
+            with METRICS.timer("domain_lookup_seconds", method="dns"):
+                socket.gethostbyname(domain)
+            verdict = "resolves"
+        except socket.error:
+            try:
+                import whois
+                with METRICS.timer("domain_lookup_seconds", method="whois"):
+                    res = whois.whois(domain)
+                verdict = "available" if res["registrar"] is None else "registered"
+            except Exception:
+                # Timeouts and rate limits are transient, the domain is looked up again by the next run
+                return "available"
+        if self.cache is not None:
+            self.cache.set("domain", domain, "", "verdict", verdict)
+        return verdict
+
+    def submit(self, domain):
+        """
+        Method used to start the lookup of a domain, a domain already in flight is not looked up twice
+        """
+        with self.lock:
+            future = self.futures.get(domain)
+            if future is None:
+                future = self.executor.submit(self.lookup, domain)
+                self.futures[domain] = future
+            return future
+
+    def check(self, domains):
+        """
+        Method used to recover the verdicts of several domains, lookups run concurrently
+        """
+        futures = {domain: self.submit(domain) for domain in domains}
+        return {domain: future.result() for domain, future in futures.items()}
+
+    def close(self):
+        """
+        Method used to stop the worker pool
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
 
 class EmailChecker:
     """
     Class used to check if an email exists
     """
 
-    def __init__(self, provider, package):
+    def __init__(self, provider, package, session=None, domains=None, cache=None):
         self.provider = provider
         self.package = package
-        self.email_urls = {"npm":"https://registry.npmjs.org/%s",
-                           "pypi":"https://pypi.org/pypi/%s/json",
-                           "cargo":"https://crates.io/api/v1/crates/%s"}
-        self.known_domains = ["gmail.com","outlook.com","hotmail.com","protonmail.com"]
+        if session is None:
+            # The client is only imported by the checks which don't share the scan's one
+            from utils.http_client import HttpClient
+            session = HttpClient()
+        self.session = session
+        # Checker shared by the analyzer, a private one is created and closed by every check otherwise
+        self.domains = domains
+        self.cache = cache
+        self.known_domains = KNOWN_DOMAINS
 
     def get_emails(self):
         """
-        Method used to make HTTP requests to recover the email
+        Method used to recover maintainer emails, the registry answer is shared with the existence check
         """
-        if self.provider not in ["go","cargo"]:
-            try:
-                res = requests.get(self.email_urls[self.provider]%(self.package), timeout=10)
-                if res.status_code == 200:
-                    data = res.json()
-                    match self.provider:
-                        case "pypi":
-                            return [data.get("info").get("author_email")]
-                        case "npm":
-                            emails = []
-                            if data.get("maintainers") is not None:
-                                for maintainer in data.get("maintainers"):
-                                    if maintainer.get("email"):
-                                        emails.append(maintainer["email"])
-                            if data.get("contributors") is not None:
-                                for contributor in data.get("contributors"):
-                                    if contributor.get("email"):
-                                        emails.append(contributor["email"])
-                            return emails
-            except Exception:
-                return []
-        else:
-            return []
+        return get_provider(self.provider).maintainers(self.package, self.session, self.cache)
 
     def check_email(self):
         """
         Method used to check if an email exists
         """
+        with METRICS.timer("phase_seconds", phase="email", provider=self.provider):
+            return self.find_takeoverable()
+
+    def find_takeoverable(self):
+        """
+        Method used to recover the [domain, email] pairs of maintainers whose domain might be purchased
+        """
         res = self.get_emails()
         real_emails = []
         takeoverable = []
-        for r in res:
-            match = re.search(r'[\w.+-]+@[\w-]+\.[\w.-]+', r)
+        for r in res or []:
+            match = re.search(r'[\w.+-]+@[\w-]+\.[\w.-]+', r or "")
             if match is not None:
                 real_emails.append(match.group(0))
 
         if len(real_emails) == 0:
             return []
 
-        for email in real_emails:
-            domain = email.split("@")[1].strip()
+        domains = [email.split("@")[1].strip() for email in real_emails]
+        checker = self.domains if self.domains is not None else DomainChecker(self.cache)
+        try:
+            verdicts = checker.check([domain for domain in dict.fromkeys(domains)
+                                      if domain not in self.known_domains])
+        finally:
+            if checker is not self.domains:
+                checker.close()
+        for email, domain in zip(real_emails, domains):
             if domain in self.known_domains:
                 continue
-            try:
-                socket.gethostbyname(domain)
-            except socket.error:
-                try:
-                    res = whois.whois(domain)
-                    if res["registrar"] is None:
-                        takeoverable.append([domain, email])
-                    else:
-                        return []
-                except Exception:
+            match verdicts[domain]:
+                case "resolves":
+                    continue
+                case "registered":
+                    return []
+                case _:
                     takeoverable.append([domain, email])
 
         return takeoverable
-    
\ No newline at end of file
@@ -0,0 +1,327 @@
+"""
+File used to declare the compact dependency graph built while walking packages
+"""
+
+import json
+import gzip
+from array import array
+from collections import deque
+from collections.abc import MutableMapping
+
+UNSET = -1
+NOT_VISITED = object()
+
+
+class Interner:
+    """
+    Class used to give every distinct string a small integer id, each string is stored once
+    """
+
+    __slots__ = ("ids", "values")
+
+    def __init__(self, values=()):
+        self.ids = {}
+        self.values = []
+        for value in values:
+            self.intern(value)
+
+    def intern(self, value):
+        """
+        Method used to recover the id of a value, a new id is given to unknown values
+        """
+        index = self.ids.get(value)
+        if index is None:
+            index = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def find(self, value):
+        """
+        Method used to recover the id of a value, None if it is unknown
+        """
+        return self.ids.get(value)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class DependencyGraph:
+    """
+    Class used to hold the packages reached by a walk with interned names and versions.
+    Per package state and edge lists live in typed arrays indexed by package id, so a node
+    costs a few bytes on top of its name instead of several dict entries and strings.
+    """
+
+    def __init__(self):
+        self.names = Interner()
+        self.versions = Interner()
+        # Version id of every visited package, UNSET until it is visited
+        self.version = array("i")
+        # Package id of the package which led to every package, UNSET for roots
+        self.parent = array("i")
+        # Dependencies of package i are edges[edge_start[i]:edge_start[i] + edge_count[i]]
+        self.edge_start = array("q")
+        self.edge_count = array("i")
+        self.edges = array("i")
+        self.edge_versions = array("i")
+        self.visited = 0
+        # Ids of the declared packages, as an ordered set
+        self.roots = {}
+
+    def node(self, name):
+        """
+        Method used to recover the id of a package, it is added to the graph if needed
+        """
+        index = self.names.intern(name)
+        if index == len(self.version):
+            self.version.append(UNSET)
+            self.parent.append(UNSET)
+            self.edge_start.append(UNSET)
+            self.edge_count.append(0)
+        return index
+
+    def visit(self, name, version):
+        """
+        Method used to mark a package as visited with the version it was checked with
+        """
+        index = self.node(name)
+        if self.version[index] == UNSET:
+            self.visited += 1
+        self.version[index] = self.versions.intern(version)
+
+    def unvisit(self, name):
+        """
+        Method used to forget that a package was visited
+        """
+        index = self.names.find(name)
+        if index is None or self.version[index] == UNSET:
+            raise KeyError(name)
+        self.version[index] = UNSET
+        self.visited -= 1
+
+    def version_of(self, name):
+        """
+        Method used to recover the version a package was visited with, NOT_VISITED if it was not
+        """
+        index = self.names.find(name)
+        if index is None or self.version[index] == UNSET:
+            return NOT_VISITED
+        return self.versions[self.version[index]]
+
+    def add_root(self, name):
+        """
+        Method used to record a package declared by the scanned projects
+        """
+        self.roots[self.node(name)] = None
+
+    def add_edges(self, name, dependencies):
+        """
+        Method used to record the (name, version) dependencies of a package, the first answer is kept
+        """
+        index = self.node(name)
+        if self.edge_start[index] != UNSET:
+            return
+        self.edge_start[index] = len(self.edges)
+        self.edge_count[index] = len(dependencies)
+        for dependency, version in dependencies:
+            self.edges.append(self.node(dependency))
+            self.edge_versions.append(self.versions.intern(version))
+
+    def merge_edges(self, name, dependencies):
+        """
+        Method used to add the dependencies of another version of a package to the recorded ones.
+        The edge list of the package is moved to the end of the edges when it grows.
+        """
+        index = self.node(name)
+        if self.edge_start[index] == UNSET:
+            self.add_edges(name, dependencies)
+            return
+        recorded = self.dependencies_of(name)
+        known = {dependency for dependency, _ in recorded}
+        added = [(dependency, version) for dependency, version in dependencies if dependency not in known]
+        if len(added) == 0:
+            return
+        self.edge_start[index] = len(self.edges)
+        self.edge_count[index] = len(recorded) + len(added)
+        for dependency, version in recorded + added:
+            self.edges.append(self.node(dependency))
+            self.edge_versions.append(self.versions.intern(version))
+
+    def dependencies_of(self, name):
+        """
+        Method used to recover the recorded (name, version) dependencies of a package
+        """
+        index = self.names.find(name)
+        if index is None or self.edge_start[index] == UNSET:
+            return []
+        start = self.edge_start[index]
+        return [(self.names[self.edges[i]], self.versions[self.edge_versions[i]])
+                for i in range(start, start + self.edge_count[index])]
+
+    def dependents(self):
+        """
+        Method used to build the reverse adjacency of the graph, as lists of package ids
+        """
+        dependents = [[] for _ in range(len(self.names))]
+        for index in range(len(self.names)):
+            start = self.edge_start[index]
+            if start != UNSET:
+                for i in range(start, start + self.edge_count[index]):
+                    dependents[self.edges[i]].append(index)
+        return dependents
+
+    def paths_to(self, name, limit=10, dependents=None):
+        """
+        Method used to find how roots pull in a package, as lists of names from a root to the package.
+        The shortest path of every root reaching the package is returned, at most `limit` of them.
+        The result of dependents() may be given when many packages are looked up.
+        """
+        target = self.names.find(name)
+        if target is None:
+            return []
+        if dependents is None:
+            dependents = self.dependents()
+        # Breadth-first search from the package towards the roots, next_hop leads back to the package
+        next_hop = {target: None}
+        queue = deque([target])
+        paths = []
+        while len(queue) != 0 and len(paths) < limit:
+            index = queue.popleft()
+            if index in self.roots:
+                path = []
+                hop = index
+                while hop is not None:
+                    path.append(self.names[hop])
+                    hop = next_hop[hop]
+                paths.append(path)
+            for dependent in dependents[index]:
+                if dependent not in next_hop:
+                    next_hop[dependent] = index
+                    queue.append(dependent)
+        return paths
+
+    def to_dict(self):
+        """
+        Method used to describe the graph as JSON serializable data, packages are referenced by id
+        """
+        return {"names": self.names.values,
+                "versions": self.versions.values,
+                "roots": list(self.roots),
+                "version": self.version.tolist(),
+                "parent": self.parent.tolist(),
+                "edge_start": self.edge_start.tolist(),
+                "edge_count": self.edge_count.tolist(),
+                "edges": self.edges.tolist(),
+                "edge_versions": self.edge_versions.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Method used to rebuild a graph described by to_dict
+        """
+        graph = cls()
+        graph.names = Interner(data["names"])
+        graph.versions = Interner(data["versions"])
+        graph.roots = dict.fromkeys(data["roots"])
+        for field in ["version", "parent", "edge_start", "edge_count", "edges", "edge_versions"]:
+            getattr(graph, field).extend(data[field])
+        graph.visited = sum(1 for version in graph.version if version != UNSET)
+        return graph
+
+
+class VisitedView(MutableMapping):
+    """
+    Class used to read and update the visited packages of a graph like a {name: version} dict
+    """
+
+    __slots__ = ("graph",)
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __contains__(self, name):
+        index = self.graph.names.find(name)
+        return index is not None and self.graph.version[index] != UNSET
+
+    def __getitem__(self, name):
+        version = self.graph.version_of(name)
+        if version is NOT_VISITED:
+            raise KeyError(name)
+        return version
+
+    def __setitem__(self, name, version):
+        self.graph.visit(name, version)
+
+    def __delitem__(self, name):
+        self.graph.unvisit(name)
+
+    def __iter__(self):
+        names = self.graph.names
+        return (names[index] for index, version in enumerate(self.graph.version) if version != UNSET)
+
+    def __len__(self):
+        return self.graph.visited
+
+
+class ParentsView(MutableMapping):
+    """
+    Class used to read and update the parent of every package of a graph like a {name: parent} dict
+    """
+
+    __slots__ = ("graph",)
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, name):
+        index = self.graph.names.find(name)
+        if index is None or self.graph.parent[index] == UNSET:
+            raise KeyError(name)
+        return self.graph.names[self.graph.parent[index]]
+
+    def get(self, name, default=None):
+        index = self.graph.names.find(name)
+        if index is None or self.graph.parent[index] == UNSET:
+            return default
+        return self.graph.names[self.graph.parent[index]]
+
+    def __setitem__(self, name, parent):
+        self.graph.parent[self.graph.node(name)] = self.graph.node(parent)
+
+    def __delitem__(self, name):
+        index = self.graph.names.find(name)
+        if index is None or self.graph.parent[index] == UNSET:
+            raise KeyError(name)
+        self.graph.parent[index] = UNSET
+
+    def __iter__(self):
+        names = self.graph.names
+        return (names[index] for index, parent in enumerate(self.graph.parent) if parent != UNSET)
+
+    def __len__(self):
+        return sum(1 for parent in self.graph.parent if parent != UNSET)
+
+
+def export_graphs(path, analyzers):
+    """
+    Method used to save the graph walked by every analyzer, gzip compressed if the path ends with .gz
+    """
+    data = {provider: dict(analyzer.graph.to_dict(),
+                           takeover=[package for package in analyzer.takeover if package is not None])
+            for provider, analyzer in analyzers.items()}
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as fd:
+        json.dump(data, fd)
+
+
+def load_graphs(path):
+    """
+    Method used to read the graphs saved by export_graphs, by provider
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as fd:
+        data = json.load(fd)
+    return {provider: DependencyGraph.from_dict(graph) for provider, graph in data.items()}
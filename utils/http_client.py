@@ -0,0 +1,196 @@
+"""
+File used to declare the HTTP client shared by every registry lookup
+"""
+
+import time
+import random
+import threading
+import email.utils
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from utils.metrics import METRICS
+from utils.misc import log
+
+THROTTLE_STATUS = (429, 503)
+DEFAULT_RATE = 200.0
+DEFAULT_HOST_CONCURRENCY = 32
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 300.0
+
+
+class RateLimitError(requests.RequestException):
+    """
+    Exception raised when a host keeps throttling after every retry
+    """
+
+
+class HostLimiter:
+    """
+    Class used to pace requests sent to one host with an adaptive token bucket.
+    The rate is halved every time the host throttles and slowly grows back on success.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE):
+        self.max_rate = rate
+        self.min_rate = min(rate, 0.5)
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Method used to wait until a request can be sent to the host
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self, delay):
+        """
+        Method used to pause the host and lower its rate after a 429 or 503
+        """
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+
+    def succeeded(self):
+        """
+        Method used to slowly raise the rate back after a successful request
+        """
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+
+def registry_url(value):
+    """
+    Method used to recover a (host, base url) registry override given as HOST=URL
+    """
+    host, separator, url = value.partition("=")
+    if not separator or not host or not url.startswith(("http://", "https://")):
+        raise ValueError(f"{value} is not a HOST=URL registry override")
+    return host, url
+
+
+def parse_retry_after(response):
+    """
+    Method used to recover the number of seconds asked by a Retry-After header
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class HttpClient:
+    """
+    Class used to send registry requests with per host rate limiting and retries.
+    Only the host which throttles is paused, requests to other hosts keep flowing.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 pool_size=10, session=None, host_concurrency=DEFAULT_HOST_CONCURRENCY, base_urls=None):
+        self.rate = rate
+        self.host_concurrency = host_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.session = session if session is not None else requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.limiters = {}
+        self.slots = {}
+        self.host_limits = {}
+        # Registry hosts answered by another server, like a mirror or a local stand-in
+        self.base_urls = {host: url.rstrip("/") for host, url in (base_urls or {}).items()}
+        self.lock = threading.Lock()
+
+    def limiter(self, host):
+        """
+        Method used to recover the limiter of a host
+        """
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = HostLimiter(self.rate)
+                self.slots[host] = threading.BoundedSemaphore(self.host_concurrency)
+            return self.limiters[host]
+
+    def limit_host(self, host, concurrency):
+        """
+        Method used to lower the number of requests in flight to a host
+        """
+        self.limiter(host)
+        with self.lock:
+            if concurrency < self.host_limits.get(host, self.host_concurrency):
+                self.host_limits[host] = concurrency
+                self.slots[host] = threading.BoundedSemaphore(concurrency)
+
+    def backoff_delay(self, attempt):
+        """
+        Method used to compute an exponential backoff with full jitter
+        """
+        return random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt))
+
+    def get(self, url, **kwargs):
+        """
+        Method used to send a GET request, throttling answers and network errors are retried
+        """
+        host = urlsplit(url).netloc
+        limiter = self.limiter(host)
+        if host in self.base_urls:
+            # Limits stay keyed by the registry host, they are tuned for it
+            url = self.base_urls[host] + url.split(host, 1)[1]
+        for attempt in range(self.retries + 1):
+            limiter.acquire()
+            try:
+                # Every analyzer shares the in-flight budget of the host
+                with self.slots[host], METRICS.timer("http_request_seconds", host=host):
+                    response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                METRICS.inc("http_errors_total", host=host)
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                METRICS.inc("http_backoff_seconds_total", delay, host=host)
+                time.sleep(delay)
+                continue
+            METRICS.inc("http_responses_total", host=host, status=response.status_code)
+            if response.status_code in THROTTLE_STATUS:
+                delay = parse_retry_after(response)
+                if delay is None:
+                    delay = self.backoff_delay(attempt)
+                # A host asking for hours must not stall the whole scan on every retry
+                delay = min(delay, MAX_BACKOFF)
+                limiter.throttled(delay)
+                METRICS.inc("http_throttled_total", host=host)
+                METRICS.inc("http_backoff_seconds_total", delay, host=host)
+                if attempt == self.retries:
+                    raise RateLimitError(f"{host} is still throttling after {self.retries} retries",
+                                         response=response)
+                log(f"[-] {host} is throttling requests, pausing it for {delay:.1f}s.")
+                continue
+            limiter.succeeded()
+            return response
+        return None
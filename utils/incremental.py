@@ -0,0 +1,115 @@
+"""
+File used to declare the state reused between two incremental scans
+"""
+
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+
+STATE_VERSION = 4
+
+
+def hash_file(path):
+    """
+    Method used to compute the content hash of a manifest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as fd:
+        for chunk in iter(lambda: fd.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IncrementalState:
+    """
+    Class used to remember parsed manifests by content hash and resolved roots by (name, version).
+    Stale entries of the providers scanned during a run are dropped when the state is saved.
+    Root results expire after `ttl` seconds (0 to never expire) so that unpublished packages are found again.
+    """
+
+    def __init__(self, path, ttl=0):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.manifests = {}
+        self.roots = {}
+        self.used_manifests = {}
+        self.used_roots = {}
+        self.providers = set()
+        self.reused_manifests = 0
+        self.reused_roots = 0
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as fd:
+                state = json.load(fd)
+            if state.get("version") == STATE_VERSION:
+                self.manifests = state["manifests"]
+                self.roots = state["roots"]
+
+    def manifest_result(self, provider, manifest, digest):
+        """
+        Method used to recover the parse result of a manifest if its content did not change
+        """
+        key = f"{provider}:{manifest}"
+        with self.lock:
+            self.providers.add(provider)
+            entry = self.manifests.get(key)
+            if entry is None or entry["hash"] != digest:
+                return None
+            self.used_manifests[key] = entry
+            self.reused_manifests += 1
+            return entry["result"]
+
+    def store_manifest(self, provider, manifest, digest, result):
+        """
+        Method used to remember the parse result of a manifest
+        """
+        with self.lock:
+            self.providers.add(provider)
+            self.used_manifests[f"{provider}:{manifest}"] = {"hash": digest, "result": result}
+
+    def root_result(self, provider, name, version):
+        """
+        Method used to recover what the resolution of a root found during a previous run, None once expired
+        """
+        with self.lock:
+            self.providers.add(provider)
+            entry = self.roots.get(provider, {}).get(f"{name}\0{version}")
+            if entry is None or (self.ttl > 0 and time.time() - entry["time"] > self.ttl):
+                return None
+            return entry["result"]
+
+    def store_root(self, provider, name, version, result, reused=False):
+        """
+        Method used to remember what the resolution of a root found.
+        A reused result keeps the time it was resolved at, replaying it doesn't make it fresh.
+        """
+        key = f"{name}\0{version}"
+        with self.lock:
+            self.providers.add(provider)
+            resolved_at = time.time()
+            if reused:
+                resolved_at = self.roots[provider][key]["time"]
+                self.reused_roots += 1
+            self.used_roots.setdefault(provider, {})[key] = {"time": resolved_at, "result": result}
+
+    def save(self):
+        """
+        Method used to atomically write the entries used by this run,
+        providers which were not scanned keep their previous entries
+        """
+        with self.lock:
+            manifests = {key: entry for key, entry in self.manifests.items()
+                         if key.split(":", 1)[0] not in self.providers}
+            manifests.update(self.used_manifests)
+            roots = {provider: entries for provider, entries in self.roots.items()
+                     if provider not in self.providers}
+            roots.update(self.used_roots)
+            tmp_path = f"{self.path}.tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=3) as fd:
+                json.dump({"version": STATE_VERSION,
+                           "manifests": manifests,
+                           "roots": roots}, fd, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,419 @@
+"""
+File used to declare the parsers of every manifest format
+"""
+
+import os
+import re
+import json
+import glob
+
+
+def load_toml(text):
+    """
+    Method used to decode a TOML document, the parser is only imported by the first TOML manifest
+    """
+    from pip._vendor import tomli
+    return tomli.loads(text)
+
+
+def parse_npm_manifest(package_json):
+    """
+    Method used to parse one package.json, returns the workspace patterns and the declared dependencies.
+    Only the content of the file is read so that the result can be reused while the file does not change.
+    """
+    workspaces = []
+    dependencies = []
+    with open(package_json,"r",encoding="utf-8") as fd:
+        content = json.loads(fd.read())
+
+    if content.get("workspaces"):
+        workspaces = content.get("workspaces")["packages"]
+
+    for section in ["dependencies", "devDependencies"]:
+        if content.get(section):
+            for name in content[section].keys():
+                if ("https" not in content[section][name]
+                    and "git" not in content[section][name]):
+                    dependencies.append((name, content[section][name]))
+    return workspaces, dependencies
+
+
+def npm_workspaces(workspaces, path):
+    """
+    Method used to recover the names of the local workspaces to exclude, they are matched in the scanned folder
+    on every run since workspaces can be added without the package.json changing
+    """
+    to_exclude = []
+    for custom_package in workspaces:
+        for filename in glob.glob(f"{path}/**/{custom_package}", recursive=True):
+            to_exclude.append(filename.split(custom_package.split("/")[0])[1].replace("/",""))
+    return to_exclude
+
+
+def parse_cargo_manifest(cargo_toml):
+    """
+    Method used to parse one Cargo.toml, returns the patched local crates and the declared dependencies
+    """
+    local_crates = []
+    dependencies = []
+    with open(cargo_toml,"r",encoding="utf-8") as fd:
+        content = load_toml(fd.read())
+
+    if content.get("patch") and content.get("patch").get("crates-io"):
+        for custom_crate in content.get("patch").get("crates-io"):
+            local_crates.append(custom_crate)
+
+    for section in ["dependencies", "dev-dependencies"]:
+        if content.get(section):
+            for name in content[section].keys():
+                if isinstance(content[section][name], str):
+                    dependencies.append((name, content[section][name]))
+                else:
+                    if (content[section][name].get("version") is not None
+                        and content[section][name].get("path") is None
+                        and content[section][name].get("git") is None):
+                        dependencies.append((name, content[section][name].get("version").split("-")[0]))
+    return local_crates, dependencies
+
+
+def parse_pypi_manifest(pypi_file):
+    """
+    Method used to parse one pyproject.toml or requirements file
+    """
+    dependencies = []
+    with open(pypi_file,"r",encoding="utf-8") as fd:
+        if pypi_file.endswith(".toml"):
+            data = load_toml(fd.read())
+            toml_dependencies = data.get("project", {}).get("dependencies", [])
+            toml_dependencies += data.get("tool", {}).get("poetry", {}).get("dependencies", {})
+            toml_dependencies += data.get("tool", {}).get("poetry", {}).get("dev-dependencies", {})
+            regex_version = r'([0-9]+\.[0-9]+\.[0-9]+)|([0-9]+\.[0-9]+)'
+            regex_name = r'[a-zA-Z0-9\-]+'
+            for dep in toml_dependencies:
+                potential_ver = re.search(regex_version,dep)
+                if potential_ver is not None:
+                    version = potential_ver.group(0)
+                else:
+                    version = ""
+                name = re.search(regex_name, dep).group(0)
+                dependencies.append((name, version))
+        else:
+            # Requirements parsed before an error are kept, the rest of the file is skipped
+            import requirements
+            try:
+                for req in requirements.parse(fd):
+                    if len(req.specs) > 0:
+                        dependencies.append((req.name, req.specs[0][1]))
+                    else:
+                        dependencies.append((req.name, ""))
+            except Exception as _:
+                pass
+    return dependencies
+
+
+def parse_go_manifest(gomod_file):
+    """
+    Method used to parse one go.mod
+    """
+    dependencies = []
+    inside_require_block = False
+    with open(gomod_file, 'r', encoding="utf-8") as file:
+        for line in file:
+            if line.startswith("require ("):
+                inside_require_block = True
+                continue
+            elif inside_require_block and line.strip() == ")":
+                inside_require_block = False
+                continue
+
+            if inside_require_block:
+                parts = line.split()
+                if len(parts) >= 2:
+                    dependencies.append((parts[0], parts[1]))
+    return dependencies
+
+
+POM_PROPERTY = re.compile(r'\$\{([^}]+)\}')
+POM_PROJECT_PROPERTIES = {("project", "version"): "project.version",
+                          ("project", "groupId"): "project.groupId",
+                          ("project", "artifactId"): "project.artifactId",
+                          ("project", "parent", "version"): "project.parent.version",
+                          ("project", "parent", "groupId"): "project.parent.groupId"}
+
+
+def resolve_pom_version(version, properties):
+    """
+    Method used to replace ${property} references in a version, returns None if one is unknown
+    """
+    for _ in range(10):
+        if "${" not in version:
+            return version
+        unknown = False
+
+        def replace(match):
+            nonlocal unknown
+            name = match.group(1)
+            if name.startswith("pom."):
+                name = "project." + name[4:]
+            if name not in properties:
+                unknown = True
+                return match.group(0)
+            return properties[name]
+
+        resolved = POM_PROPERTY.sub(replace, version)
+        if unknown:
+            return None
+        version = resolved
+    return None
+
+
+def iter_maven_dependencies(pomxml_file):
+    """
+    Method used to stream (groupId, artifactId, version) tuples out of a pom.xml.
+    Elements are cleared as soon as they are read so memory does not grow with the file. Versions
+    are resolved from <properties> and <dependencyManagement>, dependencies which can't be resolved
+    yet are emitted at the end of the file.
+    """
+    import defusedxml.ElementTree as xml
+    properties = {}
+    managed = {}
+    deferred = []
+    path = []
+    dependency = None
+    for event, elem in xml.iterparse(pomxml_file, events=("start", "end")):
+        tag = elem.tag.rsplit("}", 1)[-1]
+        if event == "start":
+            path.append(tag)
+            if tag == "dependency":
+                dependency = {}
+            continue
+
+        text = (elem.text or "").strip()
+        parent = path[-2] if len(path) > 1 else None
+        if parent == "dependency" and dependency is not None and tag in ("groupId", "artifactId", "version"):
+            dependency[tag] = text
+        elif parent == "properties" and len(path) == 3:
+            properties[tag] = text
+        elif tuple(path) in POM_PROJECT_PROPERTIES:
+            properties[POM_PROJECT_PROPERTIES[tuple(path)]] = text
+        elif tag == "dependency" and dependency is not None:
+            if dependency.get("groupId") and dependency.get("artifactId"):
+                package_name = f'{dependency["groupId"]}:{dependency["artifactId"]}'
+                if "dependencyManagement" in path:
+                    managed[package_name] = dependency.get("version")
+                version = dependency.get("version") or managed.get(package_name)
+                if version is not None:
+                    version = resolve_pom_version(version, properties)
+                if version is None:
+                    deferred.append((dependency["groupId"], dependency["artifactId"], dependency.get("version")))
+                else:
+                    yield dependency["groupId"], dependency["artifactId"], version
+            dependency = None
+        path.pop()
+        elem.clear()
+
+    if "project.version" not in properties and "project.parent.version" in properties:
+        properties["project.version"] = properties["project.parent.version"]
+    for group_id, artifact_id, version in deferred:
+        version = version or managed.get(f'{group_id}:{artifact_id}') or ""
+        yield group_id, artifact_id, resolve_pom_version(version, properties) or version
+
+
+def parse_maven_manifest(pomxml_file):
+    """
+    Method used to parse one pom.xml
+    """
+    return [(f'{group_id}:{artifact_id}', version)
+            for group_id, artifact_id, version in iter_maven_dependencies(pomxml_file)]
+
+
+def parse_gradle_manifest(buildgradle_file):
+    """
+    Method used to parse one build.gradle
+    """
+    with open(buildgradle_file, 'r') as file:
+        gradle_content = file.read()
+
+    dependency_pattern = re.compile(r'(\w+)\s\'([\w.-]+):([\w.-]+):([\w.-]+)\'')
+    return [(f'{dependency[1]}:{dependency[2]}', dependency[3])
+            for dependency in dependency_pattern.findall(gradle_content)]
+
+
+def parse_gem_manifest(gemfile_file):
+    """
+    Method used to parse one Gemfile
+    """
+    dependencies = []
+    with open(gemfile_file, 'r') as file:
+        for line in file.readlines():
+            if not line.startswith('#') and len(line.strip()) > 0:
+                if line.startswith('gem '):
+                    parts = line.split(',')
+                    package_name = re.split(r'["\']', parts[0])[1]
+                    try:
+                        version = re.split(r'["\']', parts[1])[1].split(' ')[1].strip()
+                    except:
+                        version = ''
+                    dependencies.append((package_name, version))
+    return dependencies
+
+
+def parse_package_lock(lockfile):
+    """
+    Method used to parse one package-lock.json, every installed package is returned
+    """
+    dependencies = []
+    with open(lockfile, "r", encoding="utf-8") as fd:
+        content = json.loads(fd.read())
+
+    if content.get("packages"):
+        for key, entry in content["packages"].items():
+            if "node_modules/" not in key or entry.get("link") or not entry.get("version"):
+                continue
+            if entry.get("resolved", "").startswith(("file:", "git")):
+                continue
+            dependencies.append((entry.get("name") or key.rsplit("node_modules/", 1)[1], entry["version"]))
+    else:
+        stack = list(content.get("dependencies", {}).items())
+        while len(stack) != 0:
+            name, entry = stack.pop(0)
+            version = entry.get("version", "")
+            if version.startswith("npm:"):
+                alias = version[4:]
+                name, version = alias[:alias.rfind("@")], alias[alias.rfind("@") + 1:]
+            if version and ":" not in version:
+                dependencies.append((name, version))
+            stack.extend(entry.get("dependencies", {}).items())
+    return dependencies
+
+
+YARN_LOCAL_PROTOCOLS = ("workspace:", "link:", "file:", "portal:", "patch:", "exec:", "git", "http")
+
+
+def parse_yarn_lock(lockfile):
+    """
+    Method used to parse one yarn.lock, classic and berry formats are supported
+    """
+    dependencies = []
+    current = None
+    with open(lockfile, "r", encoding="utf-8") as fd:
+        for line in fd:
+            if not line.strip() or line.startswith("#"):
+                continue
+            if not line[0].isspace():
+                current = None
+                spec = line.rstrip().rstrip(":").split(",")[0].strip().strip('"')
+                at = spec.find("@", 1)
+                if at <= 0:
+                    continue
+                name, spec_range = spec[:at], spec[at + 1:]
+                if spec_range.startswith("npm:"):
+                    spec_range = spec_range[4:]
+                    # Aliases install another package: alias@npm:real@^1.0.0
+                    if spec_range.find("@", 1) > 0:
+                        name = spec_range[:spec_range.find("@", 1)]
+                elif spec_range.startswith(YARN_LOCAL_PROTOCOLS):
+                    continue
+                current = name
+            elif current is not None and line.strip().startswith("version"):
+                version = line.strip()[len("version"):].lstrip(":").strip().strip('"')
+                dependencies.append((current, version))
+                current = None
+    return dependencies
+
+
+def parse_pnpm_lock(lockfile):
+    """
+    Method used to parse one pnpm-lock.yaml, the keys of the packages section are read
+    without a YAML parser. Lockfile versions 5, 6 and 9 are supported.
+    """
+    dependencies = []
+    lockfile_version = 0.0
+    inside_packages = False
+    with open(lockfile, "r", encoding="utf-8") as fd:
+        for line in fd:
+            if line.startswith("lockfileVersion:"):
+                try:
+                    lockfile_version = float(line.split(":", 1)[1].strip().strip("'\""))
+                except ValueError:
+                    pass
+                continue
+            if not line.startswith(" ") and line.strip():
+                inside_packages = line.rstrip() == "packages:"
+                continue
+            if not inside_packages or not line.startswith("  ") or line.startswith("   "):
+                continue
+            key = line.strip().rstrip(":").strip("'\"")
+            if lockfile_version < 6 and key.startswith("/"):
+                # /name/1.0.0_peer or /@scope/name/1.0.0
+                name, _, version = key[1:].rpartition("/")
+                version = version.split("_")[0]
+            else:
+                key = key.lstrip("/").split("(")[0]
+                at = key.rfind("@")
+                if at <= 0:
+                    continue
+                name, version = key[:at], key[at + 1:]
+            if name and version and ":" not in version:
+                dependencies.append((name, version))
+    return dependencies
+
+
+def parse_cargo_lock(lockfile):
+    """
+    Method used to parse one Cargo.lock, crates without a registry source are local
+    """
+    with open(lockfile, "r", encoding="utf-8") as fd:
+        content = load_toml(fd.read())
+    return [(package["name"], package["version"]) for package in content.get("package", [])
+            if package.get("source", "").startswith(("registry+", "sparse+"))]
+
+
+POETRY_LOCAL_SOURCES = ("directory", "file", "git", "url")
+
+
+def parse_python_lock(lockfile):
+    """
+    Method used to parse one poetry.lock or uv.lock, packages which are not installed from an index are skipped
+    """
+    dependencies = []
+    with open(lockfile, "r", encoding="utf-8") as fd:
+        content = load_toml(fd.read())
+    for package in content.get("package", []):
+        source = package.get("source")
+        if lockfile.endswith("uv.lock"):
+            if not isinstance(source, dict) or "registry" not in source:
+                continue
+        elif isinstance(source, dict) and source.get("type") in POETRY_LOCAL_SOURCES:
+            continue
+        dependencies.append((package["name"], package.get("version", "")))
+    return dependencies
+
+
+def parse_go_sum(lockfile):
+    """
+    Method used to parse one go.sum, the last version listed for a module is kept
+    """
+    modules = {}
+    with open(lockfile, "r", encoding="utf-8") as fd:
+        for line in fd:
+            parts = line.split()
+            if len(parts) >= 2:
+                modules[parts[0]] = parts[1].removesuffix("/go.mod")
+    return list(modules.items())
+
+
+LOCKFILE_PARSERS = {"package-lock.json": parse_package_lock,
+                    "yarn.lock": parse_yarn_lock,
+                    "pnpm-lock.yaml": parse_pnpm_lock,
+                    "Cargo.lock": parse_cargo_lock,
+                    "poetry.lock": parse_python_lock,
+                    "uv.lock": parse_python_lock,
+                    "go.sum": parse_go_sum}
+
+
+def parse_lockfile(lockfile):
+    """
+    Method used to parse any supported lockfile, returns the complete resolved dependency set
+    """
+    return LOCKFILE_PARSERS[os.path.basename(lockfile)](lockfile)
@@ -0,0 +1,322 @@
+"""
+File used to declare the metrics collected while scanning, disabled unless a report is asked for
+"""
+
+import json
+import time
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+MAX_SAMPLES = 1024
+METRICS_PREFIX = "depfu_"
+
+
+class Histogram:
+    """
+    Class used to count observations in cumulative buckets, like Prometheus does
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """
+        Method used to add an observation
+        """
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Method used to estimate a quantile as the upper bound of the bucket holding it
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Series:
+    """
+    Class used to keep a bounded time series, its resolution is halved every time it is full
+    """
+
+    __slots__ = ("samples", "every", "skipped")
+
+    def __init__(self):
+        self.samples = []
+        self.every = 1
+        self.skipped = 0
+
+    def add(self, elapsed, value):
+        """
+        Method used to record a sample
+        """
+        self.skipped += 1
+        if self.skipped < self.every:
+            return
+        self.skipped = 0
+        self.samples.append((round(elapsed, 3), value))
+        if len(self.samples) >= MAX_SAMPLES:
+            self.samples = self.samples[::2]
+            self.every *= 2
+
+
+class Timer:
+    """
+    Class used to observe the duration of a block in a histogram
+    """
+
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class NullTimer:
+    """
+    Class used in place of a Timer when metrics are disabled
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+def metric_key(name, labels):
+    """
+    Method used to recover the key of a metric and its labels
+    """
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+class Metrics:
+    """
+    Class used to collect counters, gauges, histograms and time series, each keyed by name and labels.
+    Every method returns at once while metrics are disabled, so hooks can stay in hot paths.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        """
+        Method used to start collecting metrics
+        """
+        self.reset()
+        self.enabled = True
+
+    def reset(self):
+        """
+        Method used to drop every collected metric
+        """
+        with self.lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+            self.series = {}
+            self.started = time.monotonic()
+
+    def inc(self, name, value=1, **labels):
+        """
+        Method used to increase a counter
+        """
+        if not self.enabled:
+            return
+        key = metric_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        """
+        Method used to set a gauge
+        """
+        if not self.enabled:
+            return
+        key = metric_key(name, labels)
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        """
+        Method used to add an observation to a histogram
+        """
+        if not self.enabled:
+            return
+        key = metric_key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def sample(self, name, value, **labels):
+        """
+        Method used to record the value of a gauge over time
+        """
+        if not self.enabled:
+            return
+        key = metric_key(name, labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = Series()
+            series.add(time.monotonic() - self.started, value)
+            self.gauges[key] = value
+            peak = metric_key(f"{name}_max", labels)
+            self.gauges[peak] = max(self.gauges.get(peak, value), value)
+
+    def timer(self, name, **labels):
+        """
+        Method used to time a block: with METRICS.timer("phase_seconds", phase="parse"): ...
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name, labels)
+
+    def to_dict(self):
+        """
+        Method used to describe every metric as JSON serializable data
+        """
+        with self.lock:
+            return {
+                "uptime_seconds": time.monotonic() - self.started,
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value}
+                           for (name, labels), value in sorted(self.gauges.items())],
+                "histograms": [{"name": name, "labels": dict(labels), "count": histogram.count,
+                                "sum": histogram.sum, "max": histogram.max,
+                                "buckets": dict(zip([str(bound) for bound in histogram.buckets],
+                                                    histogram.counts))}
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+                "series": [{"name": name, "labels": dict(labels), "samples": series.samples}
+                           for (name, labels), series in sorted(self.series.items())],
+            }
+
+    def dump(self, path):
+        """
+        Method used to write every metric to a JSON file
+        """
+        with open(path, "w", encoding="utf-8") as fd:
+            json.dump(self.to_dict(), fd, indent=2)
+
+    def prometheus(self):
+        """
+        Method used to render every metric in the Prometheus text format
+        """
+        def render(name, labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if len(pairs) == 0:
+                return METRICS_PREFIX + name
+            text = ",".join('%s="%s"' % (label, value.replace("\\", "\\\\").replace('"', '\\"'))
+                            for label, value in pairs)
+            return f"{METRICS_PREFIX}{name}{{{text}}}"
+
+        lines = []
+        typed = set()
+        with self.lock:
+            for kind, metrics in (("counter", self.counters), ("gauge", self.gauges)):
+                for (name, labels), value in sorted(metrics.items()):
+                    if name not in typed:
+                        typed.add(name)
+                        lines.append(f"# TYPE {METRICS_PREFIX}{name} {kind}")
+                    lines.append(f"{render(name, labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {METRICS_PREFIX}{name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{render(name + '_bucket', labels, [('le', str(bound))])} {cumulative}")
+                lines.append(f"{render(name + '_bucket', labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{render(name + '_sum', labels)} {histogram.sum}")
+                lines.append(f"{render(name + '_count', labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        Method used to describe where the time of the scan went, as lines of text
+        """
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = dict(self.counters)
+            gauges = sorted(self.gauges.items())
+        for (name, labels), histogram in histograms:
+            labels = dict(labels)
+            if name == "phase_seconds":
+                scope = " ".join(value for label, value in sorted(labels.items()) if label != "phase")
+                lines.append(f"phase {labels['phase']:<10} {scope:<10} {histogram.sum:9.2f}s"
+                             f"  {histogram.count} runs")
+        for (name, labels), histogram in histograms:
+            labels = dict(labels)
+            if name in ("lookup_seconds", "http_request_seconds", "domain_lookup_seconds"):
+                scope = " ".join(labels[label] for label in ("host", "endpoint", "method") if label in labels)
+                lines.append(f"{name.replace('_seconds', ''):<14} {scope:<32} {histogram.count:7d} calls"
+                             f"  mean {histogram.sum / histogram.count * 1000:7.1f}ms"
+                             f"  p95 {histogram.quantile(0.95) * 1000:7.1f}ms"
+                             f"  max {histogram.max * 1000:7.1f}ms")
+        statuses = {}
+        for (name, labels), value in sorted(counters.items()):
+            labels = dict(labels)
+            if name == "http_responses_total":
+                statuses.setdefault(labels["host"], []).append(f"{labels['status']}: {value}")
+        for host, counts in statuses.items():
+            throttled = counters.get(metric_key("http_throttled_total", {"host": host}), 0)
+            paused = counters.get(metric_key("http_backoff_seconds_total", {"host": host}), 0)
+            lines.append(f"responses      {host:<32} {', '.join(counts)}  {throttled} throttled,"
+                         f" {paused:.1f}s paused")
+        lookups = {}
+        for (name, labels), value in counters.items():
+            if name == "cache_lookups_total":
+                labels = dict(labels)
+                scope = f"{labels['provider']} {labels['endpoint']}"
+                lookups.setdefault(scope, {}).setdefault(labels["result"], 0)
+                lookups[scope][labels["result"]] += value
+        for scope, results in sorted(lookups.items()):
+            total = sum(results.values())
+            lines.append(f"cache          {scope:<32} {results.get('hit', 0) / total:7.1%} hits"
+                         f"  ({results.get('hit', 0)}/{total})")
+        for (name, labels), value in gauges:
+            if name == "frontier_size_max":
+                lines.append(f"frontier       {' '.join(value for _, value in labels):<32} max {value}")
+        return lines
+
+
+METRICS = Metrics()
@@ -2,51 +2,136 @@
 Script defining several functions used in main program
 """
 import urllib.parse
-from functools import cache
-from time import sleep
 import re
+import threading
+from utils.metrics import METRICS
 
-@cache
-def dependency_exists(name, provider, session):
+# Providers are analyzed in concurrent threads, their messages go through one lock
+PRINT_LOCK = threading.Lock()
+
+MAVEN_SEARCH = "https://search.maven.org/solrsearch/select"
+MAVEN_BATCH_SIZE = 50
+
+def log(message):
+    """
+    Method used to display a message on its own line, even when several providers print at once
+    """
+    with PRINT_LOCK:
+        print(message, flush=True)
+
+def maven_artifacts_exist(names, session, cache=None):
     """
-    Method used to check if a dependency is deprecated or not claimed
+    Method used to check many groupId:artifactId on Maven Central, OR-combined in one search per batch.
+    Returns a dict mapping every name to True, False or None if it could not be checked.
     """
+    results = {}
+    to_check = []
+    for name in dict.fromkeys(names):
+        if cache is not None:
+            found, value = cache.get("maven-central", name, "", "exists")
+            if found:
+                results[name] = value
+                continue
+        parts = name.split(':')
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            log(f"[-] Could not check {name} on Maven Central: not a groupId:artifactId")
+            results[name] = None
+            continue
+        to_check.append(name)
+
+    # requests is loaded with the HTTP client, not by every command importing the providers
+    import requests
+    for start in range(0, len(to_check), MAVEN_BATCH_SIZE):
+        batch = to_check[start:start + MAVEN_BATCH_SIZE]
+        coordinates = {name: tuple(re.sub(r'["\\]', '', part) for part in name.split(':')[:2])
+                       for name in batch}
+        query = " OR ".join(f'(g:"{group_id}" AND a:"{artifact_id}")'
+                            for group_id, artifact_id in dict.fromkeys(coordinates.values()))
+        try:
+            with METRICS.timer("lookup_seconds", host="search.maven.org", endpoint="exists"):
+                output = session.get(MAVEN_SEARCH,
+                                     params={"q": query, "core": "ga", "rows": len(batch), "wt": "json"},
+                                     timeout=10)
+            if output.status_code != 200:
+                raise requests.RequestException(f"HTTP {output.status_code}")
+            published = {(doc["g"], doc["a"]) for doc in output.json()["response"]["docs"]}
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            log(f"[-] Could not check {len(batch)} artifacts on Maven Central: {e}")
+            for name in batch:
+                results[name] = None
+            continue
+        for name in batch:
+            results[name] = coordinates[name] in published
+            if cache is not None:
+                cache.set("maven-central", name, "", "exists", results[name])
+    return results
+
+def dependency_exists(name, provider, session, cache=None):
+    """
+    Method used to check on deps.dev if a dependency is deprecated or not claimed
+    """
+    if cache is not None:
+        found, value = cache.get(provider, name, "", "exists")
+        if found:
+            return value
+    import requests
     try:
-        if "gradle" in provider :
-            groupId, artifactId = name.split(':')[0], name.split(':')[1]
-            output = session.get(f'https://search.maven.org/solrsearch/select?q=g:{groupId}+AND+a:{artifactId}&core=gav&rows=20&wt=json',
-                                timeout=10)
-            if output.json()['response']['numFound'] != 0:
-                return output
-            
-        else:
-            package = urllib.parse.quote(name,safe='')
+        package = urllib.parse.quote(name,safe='')
+        with METRICS.timer("lookup_seconds", host="deps.dev", endpoint="exists"):
             output = session.get(f"https://deps.dev/_/s/{provider}/p/{package}/v/",
                                 timeout=10)
-            return output.status_code != 404
-    except Exception:
-        print("[-] We have been rate limited, going to sleep for 5 minutes.")
-        sleep(300) #this means the API drop our requests
+        if output.status_code not in (200, 404):
+            log(f"[-] Could not check {name} on {provider}: HTTP {output.status_code}")
+            return None
+        exists = output.status_code != 404
+    except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+        #the answer is unknown, it must not be mistaken for a missing package
+        log(f"[-] Could not check {name} on {provider}: {e}")
         return None
+    if cache is not None:
+        cache.set(provider, name, "", "exists", exists)
+    return exists
+
+def sanitize_version(version):
+    """
+    Method used to strip a version down to the characters accepted by deps.dev
+    """
+    return re.sub(r'[^0-9A-Za-z\-\.]+', '', version)
+
+def extract_edges(data):
+    """
+    Method used to recover the (name, version) dependencies listed by a deps.dev answer
+    """
+    if not data or not data.get("dependencyCount"):
+        return []
+    #the first entry is the package itself
+    return [(dep["package"]["name"], dep["version"]) for dep in data["dependencies"][1:]]
 
-@cache
-def recover_dependencies(name, version, provider, session):
+def recover_dependencies(name, version, provider, session, cache=None):
     """
-    Method used to return all dependencies of a dependency
+    Method used to return all dependencies of a dependency as a list of (name, version) edges.
+    Only the edges are cached, not the whole deps.dev answer.
     """
+    version = sanitize_version(version)
+    if cache is not None:
+        found, value = cache.get(provider, name, version, "edges")
+        if found:
+            return [tuple(edge) for edge in value]
+    import requests
     try:
-        if "gradle" in provider :
-            groupId, artifactId = name.split(':')[0], name.split(':')[1]
-            output = session.get(f'https://search.maven.org/solrsearch/select?q=g:{groupId}+AND+a:{artifactId}+AND+v:{version}&core=gav&rows=20&wt=json',
-                                timeout=10)
-            if output.json()['response']['numFound'] != 0:
-                return output
-        else:
-            package = urllib.parse.quote(name,safe='')
-            version = re.sub('[^0-9A-Za-z\-\.]+', '', version)
-            return session.get(f"https://deps.dev/_/s/{provider}/p/{package}/v/{version}/dependencies"
+        package = urllib.parse.quote(name,safe='')
+        with METRICS.timer("lookup_seconds", host="deps.dev", endpoint="dependencies"):
+            output = session.get(f"https://deps.dev/_/s/{provider}/p/{package}/v/{version}/dependencies"
                             , timeout=10)
-    except Exception:
-        print("[-] We have been rate limited, going to sleep for 5 minutes.")
-        sleep(300) #this means the API drop our requests
+        if output.status_code == 200:
+            edges = extract_edges(output.json())
+        elif output.status_code == 404:
+            edges = []
+        else:
+            return None
+    except (requests.RequestException, ValueError, KeyError, IndexError, TypeError) as e:
+        log(f"[-] Could not recover dependencies of {name} on {provider}: {e}")
         return None
+    if cache is not None:
+        cache.set(provider, name, version, "edges", edges)
+    return edges
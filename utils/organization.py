@@ -0,0 +1,156 @@
+"""
+File used to declare the scan of many repositories which resolves every shared package once
+"""
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from utils.discovery import discover_manifests
+from utils.recover_dependencies import RecoverDependencies
+
+
+def load_repositories(paths=(), repos_file=None, repos_dir=None):
+    """
+    Method used to list the repositories of an organization scan, each one once and in the given order.
+    A list file holds one folder per line, relative to the file, and # starts a comment.
+    Every folder directly inside repos_dir is a repository.
+    """
+    repositories = list(paths)
+    if repos_file is not None:
+        base = os.path.dirname(os.path.abspath(repos_file))
+        with open(repos_file, "r", encoding="utf-8") as fd:
+            for line in fd:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    repositories.append(os.path.join(base, line))
+    if repos_dir is not None:
+        with os.scandir(repos_dir) as it:
+            repositories += sorted(entry.path for entry in it
+                                   if entry.is_dir() and not entry.name.startswith("."))
+    unique = {}
+    for repository in repositories:
+        unique.setdefault(os.path.abspath(repository), os.path.normpath(repository))
+    return list(unique.values())
+
+
+class OrganizationScan:
+    """
+    Class used to scan many repositories as one organization. Every repository is parsed on its own, so
+    workspaces and local crates stay local to it, then the packages declared by all of them are walked
+    by one analyzer per provider: a package shared by a hundred repositories is checked once.
+    Every distinct declared version is walked, existence is only checked once per name.
+    """
+
+    def __init__(self, scanner, repositories, providers):
+        self.scanner = scanner
+        self.repositories = repositories
+        self.providers = providers
+        # Packages walked by every provider, the first declaration of a name gives its version
+        self.roots = {provider: {} for provider in providers}
+        self.locked = {provider: set() for provider in providers}
+        # Other versions whose dependency graph must be walked too, as {provider: {(name, version): None}}
+        self.versions = {provider: {} for provider in providers}
+        # Declarations of every package, as {provider: {name: [(repository, manifest, version), ...]}}
+        self.declarations = {provider: {} for provider in providers}
+        self.analyzers = {}
+
+    def parse_repository(self, repository, incremental=None):
+        """
+        Method used to parse the manifests of one repository and merge the packages it declares
+        """
+        manifests = discover_manifests(repository, self.scanner.pruned)
+        for provider in self.providers:
+            if len(manifests.get(provider, [])) == 0:
+                continue
+            rd = RecoverDependencies(repository, provider, manifests, parse_workers=self.scanner.parse_workers,
+                                     incremental=incremental, use_lockfiles=self.scanner.use_lockfiles,
+                                     executor=self.scanner.executor)
+            rd.run()
+            roots = self.roots[provider]
+            declarations = self.declarations[provider]
+            for name, version in rd.dependencies.items():
+                if name not in roots:
+                    roots[name] = version
+                    if name in rd.locked:
+                        self.locked[provider].add(name)
+                elif name not in rd.locked and (version != roots[name] or name in self.locked[provider]):
+                    # A lockfile already lists every dependency of the version it pins
+                    self.versions[provider][(name, version)] = None
+                for manifest, declared in rd.associate_projects_dependencies.get(name, [(None, version)]):
+                    declarations.setdefault(name, []).append((repository, manifest, declared))
+
+    def analyze(self, provider, incremental=None):
+        """
+        Method used to walk the packages declared for a provider, returns None if there is none
+        """
+        if len(self.roots[provider]) == 0:
+            return None
+        analyzer = self.scanner.build_analyzer(provider, dict(self.roots[provider]), self.locked[provider],
+                                               incremental=incremental)
+        analyzer.analyze(list(self.versions[provider]))
+        return analyzer
+
+    def run(self, incremental=None):
+        """
+        Method used to parse every repository, then analyze every provider concurrently
+        """
+        for repository in self.repositories:
+            self.parse_repository(repository, incremental)
+        with ThreadPoolExecutor(max_workers=len(self.providers), thread_name_prefix="provider") as executor:
+            futures = {provider: executor.submit(self.analyze, provider, incremental)
+                       for provider in self.providers}
+            for provider, future in futures.items():
+                analyzer = future.result()
+                if analyzer is not None:
+                    self.analyzers[provider] = analyzer
+        return self.analyzers
+
+    def findings(self):
+        """
+        Method used to attribute every package which might be taken over to the manifests pulling it in.
+        Each declaration comes with the shortest chain from the declared package to the finding.
+        """
+        findings = []
+        for provider, analyzer in self.analyzers.items():
+            graph = analyzer.graph
+            dependents = graph.dependents()
+            declarations = self.declarations[provider]
+            for package, version in analyzer.takeover.items():
+                if package is None:
+                    continue
+                declared_by = []
+                for path in graph.paths_to(package, max(1, len(graph.roots)), dependents):
+                    for repository, manifest, declared in declarations.get(path[0], []):
+                        declared_by.append({"repository": repository,
+                                            "manifest": manifest,
+                                            "version": declared,
+                                            "path": path})
+                findings.append({"provider": provider,
+                                 "package": package,
+                                 "version": version,
+                                 "declared_by": declared_by})
+        return findings
+
+    def summary(self):
+        """
+        Method used to count the declarations of every provider next to the packages actually checked
+        """
+        return {provider: {"declarations": sum(len(found) for found in self.declarations[provider].values()),
+                           "declared_packages": len(self.roots[provider]),
+                           "declared_versions": len(self.roots[provider]) + len(self.versions[provider]),
+                           "checked_packages": len(self.analyzers[provider].already_done)}
+                for provider in self.analyzers}
+
+    def save(self, path, findings=None):
+        """
+        Method used to write the attributed findings of the scan to a JSON file
+        """
+        data = {"repositories": self.repositories,
+                "summary": self.summary(),
+                "findings": findings if findings is not None else self.findings(),
+                "unchecked": {provider: list(analyzer.unchecked.items())
+                              for provider, analyzer in self.analyzers.items()},
+                "email_takeover": {provider: list(analyzer.email_takeover)
+                                   for provider, analyzer in self.analyzers.items()}}
+        with open(path, "w", encoding="utf-8") as fd:
+            json.dump(data, fd, indent=2)
@@ -0,0 +1,40 @@
+"""
+File used to declare the writer streaming findings to a JSON lines file
+"""
+
+import json
+import threading
+from datetime import datetime, timezone
+
+OUTPUT_FORMATS = ["text", "jsonl"]
+
+
+class JsonlWriter:
+    """
+    Class used to append one JSON record per finding, flushed as soon as it is confirmed.
+    The file is emptied first unless a resumed scan keeps adding to it.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.count = 0
+        self.fd = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, record):
+        """
+        Method used to append a finding, a timestamp is added to the record
+        """
+        record["timestamp"] = datetime.now(timezone.utc).isoformat()
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.fd.write(line)
+            self.fd.flush()
+            self.count += 1
+
+    def close(self):
+        """
+        Method used to close the file
+        """
+        with self.lock:
+            self.fd.close()
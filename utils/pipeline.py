@@ -0,0 +1,70 @@
+"""
+File used to declare the pipeline analyzing every provider concurrently
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from utils.discovery import discover_manifests, PRUNED_DIRECTORIES
+from utils.recover_dependencies import RecoverDependencies
+from utils.providers import provider_names
+from utils.misc import log
+
+PROVIDERS = provider_names()
+
+
+class Pipeline:
+    """
+    Class used to walk the folder once, then parse and analyze each provider in its own worker.
+    Analyzers share the HTTP client, so hosts are protected by their per host budgets.
+    """
+
+    def __init__(self, build_analyzer, providers=None, parse_workers=1, pruned=PRUNED_DIRECTORIES,
+                 incremental=None, use_lockfiles=True, executor=None):
+        self.build_analyzer = build_analyzer
+        self.providers = providers if providers is not None else PROVIDERS
+        self.parse_workers = parse_workers
+        self.pruned = pruned
+        self.incremental = incremental
+        self.use_lockfiles = use_lockfiles
+        self.executor = executor
+        self.analyzers = {}
+
+    def process(self, provider, path, manifests, dependencies):
+        """
+        Method used to parse and analyze one provider, returns None if it has no dependency
+        """
+        locked = None
+        if dependencies is None:
+            rd = RecoverDependencies(path, provider, manifests, parse_workers=self.parse_workers,
+                                     incremental=self.incremental, use_lockfiles=self.use_lockfiles,
+                                     executor=self.executor)
+            rd.run()
+            dependencies = rd.dependencies
+            locked = rd.locked
+        if len(dependencies) == 0:
+            log(f"[-] No package for {provider} found.")
+            return None
+        analyzer = self.build_analyzer(provider, dict(dependencies), locked)
+        analyzer.analyze()
+        return analyzer
+
+    def run(self, path=None, dependencies=None):
+        """
+        Method used to analyze every provider, either from a folder or from a list of dependencies
+        """
+        manifests = discover_manifests(path, self.pruned) if dependencies is None else None
+        with ThreadPoolExecutor(max_workers=len(self.providers), thread_name_prefix="provider") as executor:
+            futures = {provider: executor.submit(self.process, provider, path, manifests, dependencies)
+                       for provider in self.providers}
+            for provider, future in futures.items():
+                analyzer = future.result()
+                if analyzer is not None:
+                    self.analyzers[provider] = analyzer
+        return self.analyzers
+
+    def report(self):
+        """
+        Method used to display the merged results of every provider
+        """
+        for provider, analyzer in self.analyzers.items():
+            log(f"[+] Results for {provider}:")
+            analyzer.report()
@@ -0,0 +1,342 @@
+"""
+File used to declare the provider plugins, one per ecosystem
+"""
+
+import os
+import urllib.parse
+from utils.metrics import METRICS
+from utils.misc import dependency_exists, recover_dependencies, maven_artifacts_exist, log
+from utils.manifests import (parse_npm_manifest, npm_workspaces, parse_cargo_manifest, parse_pypi_manifest,
+                             parse_go_manifest, parse_maven_manifest, parse_gradle_manifest, parse_gem_manifest,
+                             parse_lockfile)
+
+PROVIDER_REGISTRY = {}
+
+
+def register(provider_class):
+    """
+    Method used to add an ecosystem to the registry, used as a class decorator
+    """
+    PROVIDER_REGISTRY[provider_class.name] = provider_class()
+    return provider_class
+
+
+def get_provider(name):
+    """
+    Method used to recover the plugin of an ecosystem
+    """
+    return PROVIDER_REGISTRY[name]
+
+
+def provider_names():
+    """
+    Method used to recover the name of every registered ecosystem, in registration order
+    """
+    return list(PROVIDER_REGISTRY)
+
+
+class Provider:
+    """
+    Class used to declare how an ecosystem is scanned. The default methods ask deps.dev, an ecosystem
+    overrides them to use its own registry, a bulk endpoint or tighter host limits.
+    """
+
+    name = None
+    # Manifest filenames recognized during discovery
+    manifests = ()
+    # Lockfile filenames, they hold the complete resolved graph of a project
+    lockfiles = ()
+    # Registry document answering existence and maintainers, formatted with the quoted name
+    metadata_url = None
+    # batch_exists answers many names with one request
+    supports_batch_exists = False
+    # Maximum number of requests in flight per host, applied below --host-concurrency
+    host_concurrency = {}
+
+    def matches(self, filename):
+        """
+        Method used to know if a file is a manifest of the ecosystem
+        """
+        return filename in self.manifests or filename in self.lockfiles
+
+    def manifest_files(self, recover):
+        """
+        Method used to recover the manifests found by a RecoverDependencies, lockfiles excluded
+        """
+        return [manifest for manifest in recover.get_manifests(self.name)
+                if os.path.basename(manifest) not in self.lockfiles]
+
+    def parse(self, recover):
+        """
+        Method used to merge the dependencies declared by the manifests found by a RecoverDependencies
+        """
+        raise NotImplementedError
+
+    def parse_lockfiles(self, recover):
+        """
+        Method used to merge the packages resolved by lockfiles before the manifests, their exact
+        versions win. Locked packages are not expanded remotely since the lockfile holds the graph.
+        """
+        if not recover.use_lockfiles:
+            return
+        lockfiles = [manifest for manifest in recover.get_manifests(self.name)
+                     if os.path.basename(manifest) in self.lockfiles]
+        for lockfile, dependencies in zip(lockfiles, recover.parse_manifests(lockfiles, parse_lockfile)):
+            for name, version in dependencies:
+                recover.associate(lockfile, name, version)
+                if name not in recover.dependencies:
+                    recover.dependencies[name] = version
+                recover.locked.add(name)
+
+    def exists(self, name, session, cache=None):
+        """
+        Method used to check if a package exists, None if the answer is unknown
+        """
+        return dependency_exists(name, self.name, session, cache)
+
+    def batch_exists(self, names, session, cache=None):
+        """
+        Method used to check many packages at once, answers land in the cache
+        """
+        return {}
+
+    def resolve_graph(self, name, version, session, cache=None):
+        """
+        Method used to recover the dependencies of a package as (name, version) edges, None on errors
+        """
+        return recover_dependencies(name, version, self.name, session, cache)
+
+    def existence_sources(self):
+        """
+        Method used to list the cache (provider, endpoint) pairs holding existence answers
+        """
+        return [(self.name, endpoint) for endpoint in ["exists", "metadata"]]
+
+    def extract_emails(self, data):
+        """
+        Method used to recover maintainer emails from a registry document
+        """
+        return []
+
+    def metadata(self, name, session, cache=None):
+        """
+        Method used to ask the registry itself if a package exists and who maintains it, a single
+        answer serves both questions.
+        Returns {"exists": bool, "emails": list} or None if the registry could not be reached.
+        """
+        if cache is not None:
+            found, value = cache.get(self.name, name, "", "metadata")
+            if found:
+                return value
+        import requests
+        try:
+            with METRICS.timer("lookup_seconds", host=urllib.parse.urlsplit(self.metadata_url).netloc,
+                               endpoint="metadata"):
+                output = session.get(self.metadata_url % urllib.parse.quote(name, safe='@'), timeout=10)
+            if output.status_code == 200:
+                data = output.json()
+                metadata = {"exists": True, "emails": self.extract_emails(data)}
+            elif output.status_code == 404:
+                metadata = {"exists": False, "emails": []}
+            else:
+                log(f"[-] Could not recover metadata of {name} on {self.name}: HTTP {output.status_code}")
+                return None
+        except (requests.RequestException, ValueError, KeyError) as e:
+            log(f"[-] Could not recover metadata of {name} on {self.name}: {e}")
+            return None
+        if cache is not None:
+            cache.set(self.name, name, "", "metadata", metadata)
+        return metadata
+
+    def maintainers(self, name, session, cache=None):
+        """
+        Method used to recover the maintainer emails of a package
+        """
+        if self.metadata_url is None:
+            return []
+        metadata = self.metadata(name, session, cache)
+        if metadata is None:
+            return []
+        return metadata["emails"]
+
+
+@register
+class NpmProvider(Provider):
+    """
+    Class used to scan npm packages
+    """
+
+    name = "npm"
+    manifests = ("package.json",)
+    lockfiles = ("package-lock.json", "yarn.lock", "pnpm-lock.yaml")
+    metadata_url = "https://registry.npmjs.org/%s"
+
+    def parse(self, recover):
+        self.parse_lockfiles(recover)
+        manifests = self.manifest_files(recover)
+        results = recover.parse_manifests(manifests, parse_npm_manifest)
+        for manifest, (workspaces, dependencies) in zip(manifests, results):
+            recover.to_exclude.extend(npm_workspaces(workspaces, recover.path))
+            for name, version in dependencies:
+                recover.associate(manifest, name, version)
+                if (recover.dependencies.get(name) is None
+                    and name not in recover.to_exclude):
+                    recover.dependencies[name] = version
+
+    def extract_emails(self, data):
+        emails = []
+        for key in ["maintainers", "contributors"]:
+            if isinstance(data.get(key), list):
+                for person in data.get(key):
+                    if isinstance(person, dict) and person.get("email"):
+                        emails.append(person["email"])
+        return emails
+
+
+@register
+class PypiProvider(Provider):
+    """
+    Class used to scan pypi packages
+    """
+
+    name = "pypi"
+    manifests = ("pyproject.toml",)
+    lockfiles = ("poetry.lock", "uv.lock")
+    metadata_url = "https://pypi.org/pypi/%s/json"
+
+    def matches(self, filename):
+        return super().matches(filename) or (filename.startswith("requirements") and filename.endswith(".txt"))
+
+    def parse(self, recover):
+        self.parse_lockfiles(recover)
+        # pyproject.toml files are read before requirements files, first declaration wins
+        manifests = self.manifest_files(recover)
+        pypi_files = [filename for filename in manifests if filename.endswith(".toml")]
+        pypi_files += [filename for filename in manifests if not filename.endswith(".toml")]
+        results = recover.parse_manifests(pypi_files, parse_pypi_manifest)
+        for manifest, dependencies in zip(pypi_files, results):
+            for name, version in dependencies:
+                recover.associate(manifest, name, version)
+                if name not in recover.dependencies:
+                    recover.dependencies[name] = version
+
+    def extract_emails(self, data):
+        return [(data.get("info") or {}).get("author_email")]
+
+
+@register
+class CargoProvider(Provider):
+    """
+    Class used to scan cargo crates
+    """
+
+    name = "cargo"
+    manifests = ("Cargo.toml",)
+    lockfiles = ("Cargo.lock",)
+
+    def parse(self, recover):
+        self.parse_lockfiles(recover)
+        local_crates = []
+        manifests = self.manifest_files(recover)
+        results = recover.parse_manifests(manifests, parse_cargo_manifest)
+        for manifest, (custom_crates, dependencies) in zip(manifests, results):
+            local_crates.extend(custom_crates)
+            for name, version in dependencies:
+                recover.associate(manifest, name, version)
+                if recover.dependencies.get(name) is None:
+                    recover.dependencies[name] = version
+
+        #Remove local crate from dependencies (can't be takeover even if didn't exists)
+        for local_crate in local_crates:
+            if recover.dependencies.get(local_crate):
+                recover.dependencies.pop(local_crate)
+
+
+@register
+class GoProvider(Provider):
+    """
+    Class used to scan golang modules
+    """
+
+    name = "go"
+    manifests = ("go.mod",)
+    lockfiles = ("go.sum",)
+
+    def parse(self, recover):
+        self.parse_lockfiles(recover)
+        manifests = self.manifest_files(recover)
+        for manifest, dependencies in zip(manifests, recover.parse_manifests(manifests, parse_go_manifest)):
+            for module_name, version in dependencies:
+                recover.associate(manifest, module_name.replace('"',""), version)
+                if module_name not in recover.dependencies:
+                    recover.dependencies[module_name.replace('"',"")] = version
+
+
+class MavenCentralProvider(Provider):
+    """
+    Class used to share the Maven Central existence checks of JVM ecosystems
+    """
+
+    supports_batch_exists = True
+    # Maven Central search throttles aggressive clients, batches keep the request count low
+    host_concurrency = {"search.maven.org": 4}
+    parser = None
+
+    def parse(self, recover):
+        manifests = recover.get_manifests(self.name)
+        for manifest, dependencies in zip(manifests, recover.parse_manifests(manifests, self.parser)):
+            for package_name, version in dependencies:
+                recover.associate(manifest, package_name, version)
+                recover.dependencies[package_name] = version
+
+    def exists(self, name, session, cache=None):
+        return maven_artifacts_exist([name], session, cache)[name]
+
+    def batch_exists(self, names, session, cache=None):
+        return maven_artifacts_exist([name for name in names if ":" in name], session, cache)
+
+    def existence_sources(self):
+        return super().existence_sources() + [("maven-central", "exists")]
+
+
+@register
+class MavenProvider(MavenCentralProvider):
+    """
+    Class used to scan maven artifacts, dependency graphs come from deps.dev
+    """
+
+    name = "maven"
+    manifests = ("pom.xml",)
+    parser = staticmethod(parse_maven_manifest)
+
+
+@register
+class GradleProvider(MavenCentralProvider):
+    """
+    Class used to scan gradle artifacts
+    """
+
+    name = "gradle"
+    manifests = ("build.gradle",)
+    parser = staticmethod(parse_gradle_manifest)
+
+    def resolve_graph(self, name, version, session, cache=None):
+        #Maven Central search does not expose dependency graphs, gradle packages are not expanded
+        return []
+
+
+@register
+class RubygemsProvider(Provider):
+    """
+    Class used to scan ruby gems
+    """
+
+    name = "rubygems"
+    manifests = ("Gemfile",)
+
+    def parse(self, recover):
+        manifests = recover.get_manifests(self.name)
+        for manifest, dependencies in zip(manifests, recover.parse_manifests(manifests, parse_gem_manifest)):
+            for package_name, version in dependencies:
+                recover.associate(manifest, package_name, version)
+                recover.dependencies[package_name] = version
@@ -0,0 +1,98 @@
+"""
+File used to declare the library API scanning folders or dependency lists
+"""
+
+import os
+from utils.analyze_dependencies import AnalyzeDependencies
+from utils.cache import RegistryCache
+from utils.discovery import PRUNED_DIRECTORIES
+from utils.http_client import HttpClient, DEFAULT_RATE, DEFAULT_HOST_CONCURRENCY
+from utils.pipeline import Pipeline
+from utils.recover_dependencies import parser_pool
+from utils.providers import provider_names
+
+
+class Scanner:
+    """
+    Class used to scan folders or dependency lists with a warm HTTP client, registry cache and parser pool.
+    Several scans may run at the same time on one scanner, they share connections and cached answers.
+    """
+
+    def __init__(self, concurrency=1, graph_mode="recursive", check_email=False, print_takeover=False,
+                 rate=DEFAULT_RATE, host_concurrency=DEFAULT_HOST_CONCURRENCY, cache=None, snapshot=None,
+                 known=None, parse_workers=1, pruned=PRUNED_DIRECTORIES, use_lockfiles=True, base_urls=None):
+        self.concurrency = concurrency
+        self.graph_mode = graph_mode
+        self.check_email = check_email
+        self.print_takeover = print_takeover
+        self.client = HttpClient(rate=rate, pool_size=max(10, concurrency), host_concurrency=host_concurrency,
+                                 base_urls=base_urls)
+        self.cache = cache if cache is not None else RegistryCache()
+        self.snapshot = snapshot
+        self.known = known
+        self.parse_workers = parse_workers if parse_workers > 0 else os.cpu_count()
+        self.pruned = pruned
+        self.use_lockfiles = use_lockfiles
+        self.executor = None
+        if self.parse_workers > 1:
+            self.executor = parser_pool(self.parse_workers)
+
+    def build_analyzer(self, provider, dependencies, locked=None, output=None, stream=None,
+                       checkpoint=None, incremental=None):
+        """
+        Method used to create the analyzer of one provider, bound to the shared client and cache
+        """
+        return AnalyzeDependencies(provider,
+                                   dependencies,
+                                   self.print_takeover,
+                                   output,
+                                   self.check_email,
+                                   concurrency=self.concurrency,
+                                   cache=self.cache,
+                                   graph_mode=self.graph_mode,
+                                   stream=stream,
+                                   checkpoint=checkpoint,
+                                   session=self.client,
+                                   incremental=incremental,
+                                   snapshot=self.snapshot,
+                                   known=self.known,
+                                   locked=locked)
+
+    def scan(self, provider="all", path=None, dependencies=None, output=None, stream=None,
+             checkpoint=None, incremental=None):
+        """
+        Method used to analyze a folder or a {name: version} dict for one provider or "all" of them.
+        Returns the analyzers of the providers which had dependencies, by provider.
+        """
+        providers = provider_names() if provider == "all" else [provider]
+
+        def build_analyzer(name, provider_dependencies, locked=None):
+            return self.build_analyzer(name, provider_dependencies, locked, output, stream,
+                                       checkpoint, incremental)
+
+        pipeline = Pipeline(build_analyzer, providers=providers, parse_workers=self.parse_workers,
+                            pruned=self.pruned, incremental=incremental, use_lockfiles=self.use_lockfiles,
+                            executor=self.executor)
+        return pipeline.run(path=path, dependencies=dependencies)
+
+    def results(self, analyzers):
+        """
+        Method used to convert the findings of a scan to plain JSON serializable data
+        """
+        return {provider: {"takeover": [{"package": package, "version": version}
+                                        for package, version in analyzer.takeover.items()
+                                        if package is not None],
+                           "unchecked": [{"package": package, "version": version}
+                                         for package, version in analyzer.unchecked.items()],
+                           "email_takeover": list(analyzer.email_takeover)}
+                for provider, analyzer in analyzers.items()}
+
+    def close(self):
+        """
+        Method used to release the client, the cache and the parser pool
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.cache.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
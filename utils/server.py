@@ -0,0 +1,275 @@
+"""
+File used to declare the resident service running scan jobs on a shared scanner
+"""
+
+import os
+import json
+import stat
+import uuid
+import queue
+import threading
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlsplit, parse_qs
+from utils.providers import provider_names
+from utils.metrics import METRICS
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 16
+MAX_FINISHED_JOBS = 1000
+
+
+class ScanJob:
+    """
+    Class used to hold the request, the status and the results of one scan
+    """
+
+    def __init__(self, provider, path=None, dependencies=None):
+        self.id = uuid.uuid4().hex
+        self.provider = provider
+        self.path = path
+        self.dependencies = dependencies
+        self.status = "queued"
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        """
+        Method used to describe the job as JSON serializable data
+        """
+        job = {"id": self.id, "provider": self.provider, "status": self.status}
+        if self.results is not None:
+            job["results"] = self.results
+        if self.error is not None:
+            job["error"] = self.error
+        return job
+
+
+class ScanService:
+    """
+    Class used to run scan jobs on a pool of workers fed by a bounded queue.
+    Jobs submitted while the queue is full are refused instead of piling up.
+    """
+
+    def __init__(self, scanner, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.scanner = scanner
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.jobs = OrderedDict()
+        self.running = 0
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self.work, name=f"scan-{i}", daemon=True) for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, job):
+        """
+        Method used to queue a job, returns False if the queue is full
+        """
+        with self.lock:
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                return False
+            self.jobs[job.id] = job
+            # Only the most recent finished jobs are kept
+            finished = [job_id for job_id, known_job in self.jobs.items() if known_job.done.is_set()]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self.jobs[job_id]
+        return True
+
+    def get(self, job_id):
+        """
+        Method used to recover a job by id, None if it is unknown
+        """
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def work(self):
+        """
+        Method used by each worker to run jobs until the service stops
+        """
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with self.lock:
+                self.running += 1
+            job.status = "running"
+            try:
+                analyzers = self.scanner.scan(job.provider, path=job.path, dependencies=job.dependencies)
+                job.results = self.scanner.results(analyzers)
+                job.status = "done"
+            except Exception as e:
+                traceback.print_exc()
+                job.error = str(e)
+                job.status = "failed"
+            with self.lock:
+                self.running -= 1
+            METRICS.inc("scan_jobs_total", status=job.status)
+            job.done.set()
+
+    def health(self):
+        """
+        Method used to describe the load of the service
+        """
+        with self.lock:
+            return {"status": "ok", "queued": self.queue.qsize(), "running": self.running}
+
+    def stop(self):
+        """
+        Method used to stop the workers once the queued jobs are done
+        """
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+def parse_job(body):
+    """
+    Method used to validate a job request, returns (job, error)
+    """
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError:
+        return None, "body must be a JSON object"
+    if not isinstance(request, dict):
+        return None, "body must be a JSON object"
+    provider = request.get("provider", "all")
+    if provider != "all" and provider not in provider_names():
+        return None, f"unknown provider {provider}"
+    path = request.get("path")
+    dependencies = request.get("dependencies")
+    if (path is None) == (dependencies is None):
+        return None, "one of path or dependencies is required"
+    if path is not None and not os.path.isdir(path):
+        return None, f"{path} is not a folder"
+    if isinstance(dependencies, dict) and not all(isinstance(version, str) for version in dependencies.values()):
+        return None, "dependency versions must be strings"
+    if isinstance(dependencies, list):
+        # "name:version" strings like --dependency
+        parsed = {}
+        for dependency in dependencies:
+            name, _, version = str(dependency).partition(":")
+            parsed[name.strip()] = version.split(":")[0].strip()
+        dependencies = parsed
+    if dependencies is not None and not isinstance(dependencies, dict):
+        return None, "dependencies must be a {name: version} object or a list of name:version"
+    return ScanJob(provider, path, dependencies), None
+
+
+class ScanRequestHandler(BaseHTTPRequestHandler):
+    """
+    Class used to answer the HTTP API of the service:
+    POST /scans queues a job (?wait=1 answers once it is done), GET /scans/<id> returns it, GET /health
+    and GET /metrics in the Prometheus text format when metrics are enabled
+    """
+
+    service = None
+
+    def send_json(self, status, data, headers=None):
+        """
+        Method used to send a JSON answer
+        """
+        self.send_body(status, json.dumps(data).encode("utf-8"), "application/json", headers)
+
+    def send_body(self, status, body, content_type, headers=None):
+        """
+        Method used to send an answer
+        """
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self.send_json(200, self.service.health())
+            return
+        if url.path == "/metrics" and METRICS.enabled:
+            health = self.service.health()
+            METRICS.gauge("scan_jobs_queued", health["queued"])
+            METRICS.gauge("scan_jobs_running", health["running"])
+            self.send_body(200, METRICS.prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+            return
+        if url.path.startswith("/scans/"):
+            job = self.service.get(url.path[len("/scans/"):])
+            if job is not None:
+                self.send_json(200, job.to_dict())
+                return
+        self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/scans":
+            self.send_json(404, {"error": "not found"})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        job, error = parse_job(body)
+        if job is None:
+            self.send_json(400, {"error": error})
+            return
+        if not self.service.submit(job):
+            self.send_json(503, {"error": "too many queued scans"}, {"Retry-After": "5"})
+            return
+        if parse_qs(url.query).get("wait", ["0"])[0] not in ("0", ""):
+            job.done.wait()
+            self.send_json(200, job.to_dict())
+            return
+        self.send_json(202, job.to_dict(), {"Location": f"/scans/{job.id}"})
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """
+    Class used to serve the HTTP API on a Unix socket
+    """
+
+    daemon_threads = True
+
+
+def stale_socket(path):
+    """
+    Method used to know if a path is left by a previous service, only a Unix socket may be replaced
+    """
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+def serve(service, listen=None, socket_path=None):
+    """
+    Method used to answer requests until interrupted, on a host:port or on a Unix socket
+    """
+    handler = type("Handler", (ScanRequestHandler,), {"service": service})
+    if socket_path is not None:
+        if stale_socket(socket_path):
+            os.remove(socket_path)
+        elif os.path.lexists(socket_path):
+            raise FileExistsError(f"{socket_path} exists and is not a Unix socket")
+        server = ThreadingUnixHTTPServer(socket_path, handler)
+        print(f"[+] Listening on unix:{socket_path}")
+    else:
+        host, _, port = listen.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler)
+        print(f"[+] Listening on http://{host or '127.0.0.1'}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None and stale_socket(socket_path):
+            os.remove(socket_path)
+        service.stop()
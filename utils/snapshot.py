@@ -0,0 +1,203 @@
+"""
+File used to declare the offline registry snapshot answering lookups without network access
+"""
+
+import os
+import sys
+import json
+import mmap
+import array
+import struct
+import hashlib
+import threading
+from utils.cache import RegistryCache
+from utils.misc import sanitize_version, log
+
+SNAPSHOT_MAGIC = b"DEPFUSN1"
+HEADER = struct.Struct("<8sQ")
+SLOT = struct.Struct("<Q")
+LENGTH = struct.Struct("<I")
+
+
+def key_hash(key):
+    """
+    Method used to hash a table key
+    """
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def write_table(path, items):
+    """
+    Method used to write a hash table file from a dict of bytes keys to bytes values.
+    The file holds a header, an open addressing slot array of record offsets and the records.
+    """
+    slot_count = 1
+    while slot_count < 2 * max(1, len(items)):
+        slot_count *= 2
+    data_start = HEADER.size + SLOT.size * slot_count
+    slots = array.array("Q", bytes(SLOT.size * slot_count))
+    records = bytearray()
+    for key, value in items.items():
+        offset = data_start + len(records)
+        records += LENGTH.pack(len(key)) + key + LENGTH.pack(len(value)) + value
+        slot = key_hash(key) & (slot_count - 1)
+        while slots[slot] != 0:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = offset
+    if sys.byteorder != "little":
+        slots.byteswap()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as fd:
+        fd.write(HEADER.pack(SNAPSHOT_MAGIC, slot_count))
+        fd.write(slots.tobytes())
+        fd.write(records)
+    os.replace(tmp_path, path)
+
+
+class MappedTable:
+    """
+    Class used to look keys up in a memory mapped hash table file in constant time
+    """
+
+    def __init__(self, path):
+        self.fd = open(path, "rb")
+        self.map = mmap.mmap(self.fd.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.slot_count = HEADER.unpack_from(self.map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a registry snapshot")
+        self.mask = self.slot_count - 1
+
+    def get(self, key):
+        """
+        Method used to recover the value of a key, None if it is missing
+        """
+        slot = key_hash(key) & self.mask
+        while True:
+            offset = SLOT.unpack_from(self.map, HEADER.size + SLOT.size * slot)[0]
+            if offset == 0:
+                return None
+            key_length = LENGTH.unpack_from(self.map, offset)[0]
+            start = offset + LENGTH.size
+            if self.map[start:start + key_length] == key:
+                start += key_length
+                value_length = LENGTH.unpack_from(self.map, start)[0]
+                start += LENGTH.size
+                return self.map[start:start + value_length]
+            slot = (slot + 1) & self.mask
+
+    def keys(self):
+        """
+        Method used to iterate over every key of the table
+        """
+        offset = HEADER.size + SLOT.size * self.slot_count
+        while offset < len(self.map):
+            key_length = LENGTH.unpack_from(self.map, offset)[0]
+            start = offset + LENGTH.size
+            yield self.map[start:start + key_length]
+            start += key_length
+            offset = start + LENGTH.size + LENGTH.unpack_from(self.map, start)[0]
+
+    def close(self):
+        """
+        Method used to unmap the file
+        """
+        self.map.close()
+        self.fd.close()
+
+
+class RegistrySnapshot:
+    """
+    Class used to answer existence and dependency lookups of every provider from a snapshot folder.
+    Each provider has a names table and an edges table keyed by name and version.
+    """
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            raise ValueError(f"{directory} is not a registry snapshot folder")
+        self.directory = directory
+        self.tables = {}
+        # Providers without a snapshot, reported once instead of once per package
+        self.missing = set()
+        self.lock = threading.Lock()
+
+    def table(self, provider, kind):
+        """
+        Method used to open a table the first time it is needed, None if the provider was not snapshotted
+        """
+        with self.lock:
+            if (provider, kind) not in self.tables:
+                path = os.path.join(self.directory, f"{provider}.{kind}")
+                self.tables[(provider, kind)] = MappedTable(path) if os.path.exists(path) else None
+            return self.tables[(provider, kind)]
+
+    def exists(self, provider, name):
+        """
+        Method used to check if a package is in the snapshot, None if the provider was not snapshotted
+        """
+        names = self.table(provider, "names")
+        if names is None:
+            with self.lock:
+                first = provider not in self.missing
+                self.missing.add(provider)
+            if first:
+                log(f"[-] Could not check {provider} packages: no {provider} snapshot in {self.directory}")
+            return None
+        return names.get(name.encode("utf-8")) is not None
+
+    def dependencies(self, provider, name, version):
+        """
+        Method used to recover the dependencies of a package as (name, version) edges
+        """
+        edges = self.table(provider, "edges")
+        value = None
+        if edges is not None:
+            value = edges.get(f"{name}\0{sanitize_version(version)}".encode("utf-8"))
+        if value is None:
+            return []
+        return [tuple(edge) for edge in json.loads(value)]
+
+    def close(self):
+        """
+        Method used to unmap every table
+        """
+        with self.lock:
+            for table in self.tables.values():
+                if table is not None:
+                    table.close()
+            self.tables = {}
+
+
+def build_snapshot(directory, provider, names_file=None, edges_file=None, cache_dir=None):
+    """
+    Method used to build the tables of a provider from a names list, a JSON lines edges file
+    and the answers stored in a registry cache. Returns the number of names and edges written.
+    """
+    names = set()
+    edges = {}
+    if cache_dir is not None:
+        cache = RegistryCache(cache_dir)
+        names.update(cache.published(provider))
+        for name, version, value in cache.entries(provider, "edges"):
+            edges[(name, version)] = [tuple(edge) for edge in value]
+        cache.close()
+    if names_file is not None:
+        with open(names_file, "r", encoding="utf-8") as fd:
+            for line in fd:
+                if line.strip():
+                    names.add(line.strip())
+    if edges_file is not None:
+        with open(edges_file, "r", encoding="utf-8") as fd:
+            for line in fd:
+                if line.strip():
+                    edge = json.loads(line)
+                    names.add(edge["name"])
+                    edges[(edge["name"], sanitize_version(edge.get("version", "")))] = \
+                        [tuple(dep) for dep in edge.get("dependencies", [])]
+
+    os.makedirs(directory, exist_ok=True)
+    write_table(os.path.join(directory, f"{provider}.names"),
+                {name.encode("utf-8"): b"" for name in sorted(names)})
+    write_table(os.path.join(directory, f"{provider}.edges"),
+                {f"{name}\0{version}".encode("utf-8"): json.dumps(dependencies).encode("utf-8")
+                 for (name, version), dependencies in sorted(edges.items())})
+    return len(names), len(edges)